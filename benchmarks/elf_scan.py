@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  This file is part of ypkg2
+#
+#  Copyright 2025 Solus Project
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Compare the in-process dynamic section reader against the historical
+#  `readelf -d` scan, i.e.:
+#
+#      python3 benchmarks/elf_scan.py /usr/lib64 /usr/bin
+#
+
+import os
+import re
+import subprocess
+import sys
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ypkg2.elf import ELF_MAGIC, open_elf  # noqa: E402
+
+shared_lib = re.compile(r".*Shared library: \[(.*)\].*")
+r_path = re.compile(r".*Library rpath: \[(.*)\].*")
+run_path = re.compile(r".*Library runpath: \[(.*)\].*")
+r_soname = re.compile(r".*Library soname: \[(.*)\].*")
+
+
+def find_elf_files(roots, limit):
+    found = list()
+    for root in roots:
+        for dirpath, dirs, files in os.walk(root):
+            for f in files:
+                fpath = os.path.join(dirpath, f)
+                if os.path.islink(fpath) or not os.path.isfile(fpath):
+                    continue
+                try:
+                    with open(fpath, "rb") as fd:
+                        if fd.read(4) != ELF_MAGIC:
+                            continue
+                except Exception:
+                    continue
+                found.append(fpath)
+                if len(found) >= limit:
+                    return found
+    return found
+
+
+def scan_readelf(file):
+    needed = set()
+    rpaths = set()
+    soname = None
+    cmd = 'LC_ALL=C /usr/bin/readelf -d "{}"'.format(file)
+    try:
+        output = subprocess.check_output(cmd, shell=True, stderr=subprocess.DEVNULL).decode()
+    except Exception:
+        return None
+    for line in output.split("\n"):
+        line = line.strip()
+        r = r_path.match(line) or run_path.match(line)
+        if r:
+            rpaths.update(r.group(1).split(":"))
+            continue
+        m = shared_lib.match(line)
+        if m:
+            needed.add(m.group(1))
+            continue
+        so = r_soname.match(line)
+        if so:
+            soname = so.group(1)
+    return (needed, rpaths, soname)
+
+
+def scan_native(file):
+    try:
+        with open_elf(file) as efile:
+            dyn = efile.get_dynamic_info()
+    except Exception:
+        return None
+    rpaths = set()
+    for rpath in (dyn.rpath, dyn.runpath):
+        if rpath is not None:
+            rpaths.update(rpath.split(":"))
+    return (set(dyn.needed), rpaths, dyn.soname)
+
+
+def main():
+    roots = sys.argv[1:] or ["/usr/lib64", "/usr/lib", "/usr/bin"]
+    files = find_elf_files(roots, 2000)
+    print("Scanning {} ELF files".format(len(files)))
+
+    start = timer()
+    readelf_results = [scan_readelf(f) for f in files]
+    readelf_time = timer() - start
+
+    start = timer()
+    native_results = [scan_native(f) for f in files]
+    native_time = timer() - start
+
+    mismatches = [f for f, a, b in zip(files, readelf_results, native_results) if a is not None and a != b]
+    print("readelf -d: {:.3f}s".format(readelf_time))
+    print("in-process: {:.3f}s ({:.1f}x)".format(native_time, readelf_time / max(native_time, 1e-9)))
+    for f in mismatches:
+        print("Mismatch: {}".format(f))
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  This file is part of ypkg2
+#
+#  Copyright 2025 Solus Project
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Compare the compiled pattern trie against testing every StringPathGlob
+#  in turn, over a synthetic tree of installed files, i.e.:
+#
+#      python3 benchmarks/pattern_match.py 1000000
+#
+
+import os
+import random
+import sys
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ypkg2.packages import PackageGenerator, PRIORITY_USER  # noqa: E402
+from ypkg2.patternmatch import PatternMatcher  # noqa: E402
+from ypkg2.stringglob import StringPathGlob  # noqa: E402
+
+
+class Spec:
+    pkg_name = "bench"
+    pkg_permanent = None
+    pkg_libsplit = True
+
+
+# Typical user patterns, as found across the package repository
+USER_PATTERNS = [
+    ("devel", "/usr/lib64/bench/*.h"),
+    ("docs", "/usr/share/doc/bench/html/"),
+    ("tools", "/usr/bin/bench-*"),
+    ("32bit", "/usr/lib32/bench/"),
+    ("plugins", "/usr/lib64/bench/plugins/*/*.so"),
+]
+
+DIRS = [
+    "/usr/bin",
+    "/usr/lib64",
+    "/usr/lib64/bench/plugins/{}",
+    "/usr/lib64/pkgconfig",
+    "/usr/lib64/cmake/Bench{}",
+    "/usr/lib32",
+    "/usr/lib/debug/.build-id/{}",
+    "/usr/include/bench/{}",
+    "/usr/share/bench/data/{}",
+    "/usr/share/doc/bench/html/{}",
+    "/usr/share/locale/{}/LC_MESSAGES",
+    "/usr/share/man/man{}",
+    "/usr/share/gir-1.0",
+    "/usr/share/qt5/doc",
+    "/usr/lib64/qt6/metatypes",
+]
+
+NAMES = [
+    "bench-{}",
+    "libbench{}.so",
+    "libbench{}.so.1",
+    "libbench{}.a",
+    "bench{}.pc",
+    "Bench{}Config.cmake",
+    "bench{}.h",
+    "{}.debug",
+    "data{}.json",
+    "bench{}.mo",
+    "bench{}.1",
+    "Bench-{}.gir",
+    "qtbench{}.qch",
+    "qtbench{}metatypes.json",
+]
+
+
+def make_paths(count):
+    rng = random.Random(0)
+    paths = list()
+    for i in range(count):
+        dirn = rng.choice(DIRS).format(i % 97)
+        name = rng.choice(NAMES).format(i)
+        paths.append("{}/{}".format(dirn, name))
+    return paths
+
+
+def linear_match(patterns, path):
+    """The historical get_pattern"""
+    matches = [p for p in patterns if p.match(path)]
+    if len(matches) == 0:
+        return None
+    matches = sorted(matches, key=StringPathGlob.get_priority, reverse=True)
+    return matches[0]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    gene = PackageGenerator(Spec())
+    for n, (pkg, pt) in enumerate(USER_PATTERNS):
+        gene.add_pattern(pt, pkg, priority=PRIORITY_USER + n)
+    patterns = list(gene.patterns)
+
+    paths = make_paths(count)
+    print("Matching {} paths against {} patterns".format(len(paths), len(patterns)))
+
+    start = timer()
+    matcher = PatternMatcher(patterns)
+    compile_time = timer() - start
+
+    start = timer()
+    trie_results = [matcher.match(p) for p in paths]
+    trie_time = timer() - start
+
+    start = timer()
+    linear_results = [linear_match(patterns, p) for p in paths]
+    linear_time = timer() - start
+
+    mismatches = [p for p, a, b in zip(paths, linear_results, trie_results) if a is not b]
+    print("linear: {:.3f}s".format(linear_time))
+    print(
+        "trie:   {:.3f}s ({:.1f}x), compiled in {:.6f}s".format(
+            trie_time, linear_time / max(trie_time, 1e-9), compile_time
+        )
+    )
+    for p in mismatches[0:20]:
+        print("Mismatch: {}".format(p))
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
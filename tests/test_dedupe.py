@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  This file is part of ypkg2
+#
+#  Copyright 2025 Solus Project
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+
+import os
+
+from ypkg2.dedupe import DEDUPE_SYMLINK, dedupe_packages
+from ypkg2.examine import PackageExaminer
+from ypkg2.packages import PackageGenerator
+
+
+class Spec:
+    pkg_name = "test"
+    pkg_permanent = None
+    pkg_libsplit = True
+    pkg_lastrip = True
+    pkg_dedupe = DEDUPE_SYMLINK
+
+
+class Build:
+    jobcount = 2
+
+
+class Context:
+    spec = Spec()
+    build = Build()
+
+    def __init__(self, install_dir):
+        self.install_dir = install_dir
+
+    def get_install_dir(self):
+        return self.install_dir
+
+
+def install(install_dir, files):
+    gene = PackageGenerator(Spec())
+    for pretty in files:
+        fpath = os.path.join(install_dir, pretty[1:])
+        os.makedirs(os.path.dirname(fpath), exist_ok=True)
+        with open(fpath, "w") as outfile:
+            outfile.write("identical contents\n")
+        gene.add_file(pretty)
+    return gene
+
+
+def test_symlink_source_survives_removal(tmp_path):
+    # The /emul32 copy sorts first, but examine removes it afterwards
+    doomed = "/emul32/usr/share/test/a.txt"
+    first = "/usr/share/test/a.txt"
+    second = "/usr/share/test/b.txt"
+    gene = install(str(tmp_path), [doomed, first, second])
+
+    count, saved = dedupe_packages(Context(str(tmp_path)), gene, PackageExaminer())
+
+    assert count == 1
+    assert saved == len("identical contents\n")
+    assert not os.path.islink(os.path.join(str(tmp_path), doomed[1:]))
+    assert not os.path.islink(os.path.join(str(tmp_path), first[1:]))
+    link = os.path.join(str(tmp_path), second[1:])
+    assert os.readlink(link) == "a.txt"
+    os.unlink(os.path.join(str(tmp_path), doomed[1:]))
+    assert os.path.exists(link)
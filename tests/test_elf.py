@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  This file is part of ypkg2
+#
+#  Copyright 2025 Solus Project
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+
+import struct
+
+from ypkg2.elf import ELFCLASS64, ELFDATA2LSB, ELF_MAGIC, ET_DYN, NT_GNU_BUILD_ID, PT_NOTE, ElfFile
+
+NT_GNU_PROPERTY_TYPE_0 = 5
+
+BUILD_ID = bytes(range(20))
+
+
+def make_note(name, ntype, desc, align):
+    """A note with the name padded to 4, and the descriptor and the end of
+    the note padded to align, given a note starting on an aligned offset"""
+    data = struct.pack("<III", len(name), len(desc), ntype) + name
+    data += b"\0" * (-len(data) % align)
+    data += desc
+    data += b"\0" * (-len(data) % align)
+    return data
+
+
+def make_elf(notes, align):
+    """A bare ELF64 object with a single PT_NOTE segment"""
+    phoff = 64
+    offset = phoff + 56
+    ehdr = ELF_MAGIC + bytes([ELFCLASS64, ELFDATA2LSB, 1]) + b"\0" * 9
+    ehdr += struct.pack("<HHIQQQIHHHHHH", ET_DYN, 62, 1, 0, phoff, 0, 0, 64, 56, 1, 64, 0, 0)
+    phdr = struct.pack("<IIQQQQQQ", PT_NOTE, 4, offset, 0, 0, len(notes), len(notes), align)
+    return ehdr + phdr + notes
+
+
+def test_build_id_after_property_note_in_8_aligned_segment():
+    # As linked into binaries using CET/BTI, the property note comes first
+    notes = make_note(b"GNU\0", NT_GNU_PROPERTY_TYPE_0, b"\x02\x00\x00\xc0" + b"\1" * 12, 8)
+    notes += make_note(b"GNU\0", NT_GNU_BUILD_ID, BUILD_ID, 8)
+    efile = ElfFile(make_elf(notes, 8))
+    assert [(n, t) for n, t, _ in efile.iter_notes()] == [
+        (b"GNU", NT_GNU_PROPERTY_TYPE_0),
+        (b"GNU", NT_GNU_BUILD_ID),
+    ]
+    assert efile.get_build_id() == BUILD_ID
+
+
+def test_odd_name_in_8_aligned_segment():
+    # A 6 byte name leaves the descriptor at 24, not 12 + 8
+    notes = make_note(b"Linux\0", 1, b"\1" * 4, 8)
+    notes += make_note(b"GNU\0", NT_GNU_BUILD_ID, BUILD_ID, 8)
+    efile = ElfFile(make_elf(notes, 8))
+    assert list(efile.iter_notes())[0] == (b"Linux", 1, b"\1" * 4)
+    assert efile.get_build_id() == BUILD_ID
+
+
+def test_build_id_in_4_aligned_segment():
+    notes = make_note(b"Linux\0", 1, b"\1" * 6, 4)
+    notes += make_note(b"GNU\0", NT_GNU_BUILD_ID, BUILD_ID, 4)
+    efile = ElfFile(make_elf(notes, 4))
+    assert efile.get_build_id() == BUILD_ID
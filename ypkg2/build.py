@@ -25,11 +25,15 @@ from datetime import timedelta
 import ypkg2
 from . import metadata
 from .compressdoc import compress_info_pages, compress_man_pages
+from .debuginfo import DEBUG_COMPRESS_NONE, process_debug_files
+from .debuginfod import index_build_ids
+from .dedupe import dedupe_packages, DEDUPE_NONE
 from .dependencies import DependencyResolver
-from .examine import PackageExaminer
+from .examine import PackageExaminer, STRIP_MODE_SEPARATE, resolve_strip_mode
 from .packages import PackageGenerator, PRIORITY_USER
 from .scripts import ScriptGenerator
 from .sources import SourceManager
+from .stripcache import StripCache, DEFAULT_CACHE_SIZE
 from .util import console_ui, remove_prefix, EMUL32PC
 from .ypkgcontext import YpkgContext
 from .ypkgspec import YpkgSpec
@@ -110,7 +114,17 @@ def execute_step(context, step, step_n, work_dir):
     return True
 
 
-def build_package(filename, outputDir, buildDir=None):
+def build_package(
+    filename,
+    outputDir,
+    buildDir=None,
+    stripMode=STRIP_MODE_SEPARATE,
+    stripCacheSize=DEFAULT_CACHE_SIZE,
+    examineProfile=False,
+    debugCompress=DEBUG_COMPRESS_NONE,
+    dwz=False,
+    miniDebugInfo=False,
+):
     """Will in future be moved to a separate part of the module"""
     spec = YpkgSpec()
     if not spec.load_from_path(filename):
@@ -174,6 +188,14 @@ def build_package(filename, outputDir, buildDir=None):
     console_ui.emit_info("Info", f"Building {spec.pkg_name}-{spec.pkg_version}")
 
     ctx = YpkgContext(spec)
+    ctx.strip_mode = resolve_strip_mode(stripMode)
+    if stripCacheSize > 0:
+        cache_dir = os.path.join(ctx.get_build_prefix(), "strip-cache")
+        ctx.strip_cache = StripCache(cache_dir, stripCacheSize * 1024 * 1024)
+    ctx.debug_compress = debugCompress
+    ctx.dwz = dwz
+    ctx.minidebuginfo = miniDebugInfo
+    ctx.examine_profile = examineProfile
 
     need_verify = []
     for src in manager.sources:
@@ -347,7 +369,7 @@ def build_package(filename, outputDir, buildDir=None):
 
     # Add user patterns - each consecutive package has higher priority than the
     # package before it, ensuring correct levels of control
-    gene = PackageGenerator(spec)
+    gene = PackageGenerator(spec, ctx.get_install_dir())
     count = 0
     for pkg in spec.patterns:
         for pt in spec.patterns[pkg]:
@@ -378,6 +400,25 @@ def build_package(filename, outputDir, buildDir=None):
             if os.path.islink(fpath):
                 gene.add_file(remove_prefix(fpath, idir))
 
+    exa = PackageExaminer()
+    # Avoid expensive self calculations for kernels
+    exa.can_kernel = True
+    if spec.get_component("main") == "kernel.image":
+        exa.can_kernel = False
+
+    # Replace identical files within each package with links
+    if spec.pkg_dedupe and spec.pkg_dedupe != DEDUPE_NONE:
+        console_ui.emit_info("Dedupe", "Deduplicating identical files...")
+        try:
+            (count, saved) = dedupe_packages(ctx, gene, exa)
+            console_ui.emit_success(
+                "Dedupe",
+                f"Replaced {count} duplicate file(s), saving {naturalsize(saved)}",
+            )
+        except Exception as e:
+            console_ui.emit_warning("Dedupe", "Failed to deduplicate files")
+            print(e)
+
     if not os.path.exists(ctx.get_packaging_dir()):
         try:
             os.makedirs(ctx.get_packaging_dir(), mode=0o0755)
@@ -386,16 +427,14 @@ def build_package(filename, outputDir, buildDir=None):
             print(e)
             sys.exit(1)
 
-    exa = PackageExaminer()
-    # Avoid expensive self calculations for kernels
-    exa.can_kernel = True
-    if spec.get_component("main") == "kernel.image":
-        exa.can_kernel = False
-
     exaResults = exa.examine_packages(ctx, list(gene.packages.values()))
     if exaResults is None:
         console_ui.emit_error("Package", "Failed to correctly examine all packages.")
         sys.exit(1)
+    if examineProfile:
+        exa.profile.report()
+
+    process_debug_files(ctx, exaResults)
 
     deps = DependencyResolver()
     if not deps.compute_for_packages(ctx, gene, exaResults):
@@ -430,17 +469,36 @@ def build_package(filename, outputDir, buildDir=None):
 
     gene.emit_packages()
     # TODO: Ensure main is always first
+    emitted = dict()
     for package in sorted(gene.packages):
         pkg = gene.packages[package]
-        files = sorted(pkg.emit_files())
+        files = pkg.emit_files()
         if len(files) == 0:
             console_ui.emit_info("Package", f"Skipping empty package: {package}")
             continue
         metadata.create_eopkg(ctx, gene, pkg, outputDir)
+        emitted[package] = metadata.construct_package_name(ctx, pkg)
 
     # Write out the final pspec
     metadata.write_spec(ctx, gene, outputDir)
 
+    try:
+        count = index_build_ids(ctx, gene, exaResults, outputDir, emitted)
+        if count > 0:
+            console_ui.emit_info("Debug", f"Indexed {count} build-id(s)")
+    except Exception as e:
+        console_ui.emit_warning("Debug", "Failed to update the build-id index")
+        print(e)
+
+    if examineProfile:
+        ppath = os.path.join(outputDir, f"examine-profile_{ctx.build.arch}.json")
+        try:
+            exa.profile.write(ppath)
+            console_ui.emit_info("Profile", f"Wrote examine profile to {ppath}")
+        except Exception as e:
+            console_ui.emit_warning("Profile", "Failed to write examine profile")
+            print(e)
+
     for pkg in spec.patterns:
         if pkg in gene.packages:
             continue
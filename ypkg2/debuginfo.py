@@ -0,0 +1,273 @@
+#!/bin/true
+# -*- coding: utf-8 -*-
+#
+#  This file is part of ypkg2
+#
+#  Copyright 2025 Solus Project
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+
+import multiprocessing
+import os
+import shutil
+import stat
+import struct
+import subprocess
+import zlib
+
+from datetime import timedelta
+from humanize import naturalsize
+from timeit import default_timer as timer
+
+from .elf import open_elf
+from .util import console_ui
+
+DEBUG_COMPRESS_NONE = "none"
+DEBUG_COMPRESS_ZLIB = "zlib"
+DEBUG_COMPRESS_ZSTD = "zstd"
+
+DEBUG_COMPRESSION = [DEBUG_COMPRESS_NONE, DEBUG_COMPRESS_ZLIB, DEBUG_COMPRESS_ZSTD]
+
+
+def get_uncompressed_size(files):
+    total = 0
+    for fpath in files:
+        try:
+            with open_elf(fpath) as efile:
+                total += efile.get_uncompressed_size()
+        except Exception:
+            total += get_size([fpath])
+    return total
+
+
+def get_size(files):
+    total = 0
+    for fpath in files:
+        try:
+            total += os.path.getsize(fpath)
+        except Exception:
+            pass
+    return total
+
+
+def will_run_dwz(context):
+    return context.dwz and shutil.which("dwz") is not None
+
+
+def get_split_compression(context):
+    """Compression to apply while splitting out the debug information, or
+    None. When dwz is to run it cannot read compressed sections, so the
+    compression is left for process_debug_files instead."""
+    compression = context.debug_compress or DEBUG_COMPRESS_NONE
+    if compression == DEBUG_COMPRESS_NONE or will_run_dwz(context):
+        return None
+    return compression
+
+
+def get_crc32(fpath):
+    crc = 0
+    with open(fpath, "rb") as infile:
+        while True:
+            buf = infile.read(1024 * 1024)
+            if not buf:
+                break
+            crc = zlib.crc32(buf, crc)
+    return crc
+
+
+def fix_debuglink(file, debug_file):
+    """Update the CRC32 stored in the .gnu_debuglink section of file in
+    place, after debug_file has been rewritten, as sepdebugcrcfix does.
+    Without a build-id this CRC is all a debugger has to go by."""
+    with open_elf(file) as efile:
+        shdr = efile.get_section(".gnu_debuglink")
+        if shdr is None or shdr.sh_size < 8:
+            return False
+        fmt = efile.endian + "I"
+    # The CRC follows the NUL terminated name, padded to 4 bytes
+    offset = shdr.sh_offset + shdr.sh_size - 4
+    crc = struct.pack(fmt, get_crc32(debug_file))
+
+    mode = None
+    if not os.access(file, os.W_OK):
+        mode = stat.S_IMODE(os.stat(file).st_mode)
+        os.chmod(file, mode | stat.S_IWUSR)
+    try:
+        with open(file, "r+b") as outfile:
+            outfile.seek(offset)
+            outfile.write(crc)
+    finally:
+        if mode is not None:
+            os.chmod(file, mode)
+    return True
+
+
+def fix_debuglinks(item):
+    """Pool worker, fixing up the binaries linking to one debug file"""
+    debug_file, binaries = item
+    for fpath in binaries:
+        try:
+            fix_debuglink(fpath, debug_file)
+        except Exception as e:
+            console_ui.emit_warning("Debug", "Failed to fix .gnu_debuglink")
+            print(e)
+
+
+def compress_debug(item):
+    """Pool worker, compressing the DWARF sections of a debug file into
+    SHF_COMPRESSED sections"""
+    compression, fpath = item
+    cmd = 'objcopy --compress-debug-sections={} "{}"'.format(compression, fpath)
+    try:
+        subprocess.check_call(cmd, shell=True)
+    except Exception as e:
+        console_ui.emit_warning("objcopy", "Failed --compress-debug-sections")
+        print(e)
+        return False
+    return True
+
+
+def run_dwz(item):
+    """Pool worker, de-duplicating DWARF across the debug files of one
+    package. Anything common to several files is moved into a shared
+    multifile, which the rest then refer to via .gnu_debugaltlink"""
+    files, multifile, multifile_full = item
+    cmd = ["dwz", "-h", "-q"]
+    if len(files) > 1:
+        os.makedirs(os.path.dirname(multifile_full), mode=0o0755, exist_ok=True)
+        cmd.extend(["-m", multifile_full, "-M", multifile])
+    try:
+        # Failing on a few odd files is not fatal, everything else is done
+        subprocess.call(cmd + files)
+    except Exception as e:
+        console_ui.emit_warning("dwz", "Failed to run dwz")
+        print(e)
+        return None
+    if os.path.exists(multifile_full):
+        return multifile_full
+    return None
+
+
+def report_split_compression(context, examinations, files, compression):
+    """Report on the debug files compressed while splitting, the original
+    size being recovered from the compression headers and the time from
+    the (cumulative) time spent splitting and stripping"""
+    split_time = 0
+    for pkg in examinations:
+        for info in examinations[pkg]:
+            if info.debug_file and info.strip_time:
+                split_time += info.strip_time
+    console_ui.emit_success(
+        "Debug",
+        "{}: {} debug file(s), {} -> {} in {} of splitting".format(
+            compression,
+            len(files),
+            naturalsize(get_uncompressed_size(files)),
+            naturalsize(get_size(files)),
+            timedelta(seconds=split_time),
+        ),
+    )
+
+
+def process_debug_files(context, examinations):
+    """Post-process the split debug files written during examine, running
+    dwz over the files of each package and then compressing them, as
+    requested for this build. Without dwz the compression is done during
+    the split instead. The .gnu_debuglink CRCs of the stripped files are
+    then updated to match, and sizes before and after are reported."""
+    compression = context.debug_compress or DEBUG_COMPRESS_NONE
+    dwz = will_run_dwz(context)
+    if context.dwz and not dwz:
+        console_ui.emit_warning("Debug", "dwz not found, skipping DWARF dedupe")
+    if compression == DEBUG_COMPRESS_NONE and not dwz:
+        return
+
+    install_dir = context.get_install_dir()
+
+    # The 32-bit debug files need their own multifile. Hardlinks share
+    # their debug file, which must only be handed to dwz once.
+    groups = dict()
+    binaries = dict()
+    for pkg in sorted(examinations):
+        for info in examinations[pkg]:
+            if not info.debug_file:
+                continue
+            fpath = os.path.join(install_dir, info.debug_file[1:])
+            if fpath not in binaries:
+                binaries[fpath] = list()
+            binaries[fpath].append(os.path.join(install_dir, info.pretty[1:]))
+            if len(binaries[fpath]) > 1:
+                continue
+            key = (pkg, info.emul32)
+            if key not in groups:
+                groups[key] = dict()
+            # Kernel modules are relocatable objects, dwz won't handle them
+            groups[key][fpath] = not info.pretty.endswith(".ko")
+
+    files = sorted(binaries)
+    if len(files) == 0:
+        return
+    if not dwz:
+        report_split_compression(context, examinations, files, compression)
+        return
+    size_before = get_size(files)
+    start_time = timer()
+
+    jobs = max(1, min(context.build.jobcount, len(files)))
+    with multiprocessing.Pool(processes=jobs) as pool:
+        work = list()
+        for key in sorted(groups):
+            pkg, emul32 = key
+            libdir = "/usr/lib32" if emul32 else "/usr/lib"
+            multifile = "{}/debug/.dwz/{}".format(
+                libdir, context.spec.get_package_name(pkg)
+            )
+            dfiles = [x for x in sorted(groups[key]) if groups[key][x]]
+            if len(dfiles) == 0:
+                continue
+            multifile_full = os.path.join(install_dir, multifile[1:])
+            work.append((dfiles, multifile, multifile_full))
+        multifiles = list()
+        for multifile in pool.imap_unordered(run_dwz, work):
+            if multifile is not None:
+                multifiles.append(multifile)
+        dwz_time = timer() - start_time
+        console_ui.emit_info(
+            "Debug",
+            "dwz: {} -> {} in {}".format(
+                naturalsize(size_before),
+                naturalsize(get_size(files + multifiles)),
+                timedelta(seconds=dwz_time),
+            ),
+        )
+
+        if compression != DEBUG_COMPRESS_NONE:
+            compress_start = timer()
+            size_compress = get_size(files + multifiles)
+            pool.map(compress_debug, [(compression, x) for x in files + multifiles])
+            console_ui.emit_info(
+                "Debug",
+                "{}: {} -> {} in {}".format(
+                    compression,
+                    naturalsize(size_compress),
+                    naturalsize(get_size(files + multifiles)),
+                    timedelta(seconds=timer() - compress_start),
+                ),
+            )
+
+        # The debug files no longer match the CRCs stored when splitting
+        pool.map(fix_debuglinks, [(x, binaries[x]) for x in files])
+
+    console_ui.emit_success(
+        "Debug",
+        "Processed {} debug file(s): {} -> {} in {}".format(
+            len(files) + len(multifiles),
+            naturalsize(size_before),
+            naturalsize(get_size(files + multifiles)),
+            timedelta(seconds=timer() - start_time),
+        ),
+    )
@@ -0,0 +1,208 @@
+#!/bin/true
+# -*- coding: utf-8 -*-
+#
+#  This file is part of ypkg2
+#
+#  Copyright 2025 Solus Project
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+
+import os
+import re
+import shutil
+import sqlite3
+import tarfile
+import tempfile
+import zipfile
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .util import console_ui
+
+# Lives in the output directory, next to the packages it indexes
+INDEX_NAME = "buildid-index.db"
+
+BUILDID_DEBUGINFO = "debuginfo"
+BUILDID_EXECUTABLE = "executable"
+
+build_id_path = re.compile(r".*/\.build-id/([0-9a-f]{2})/([0-9a-f]+)\.debug$")
+request_path = re.compile(r"^/buildid/([0-9a-fA-F]+)/(debuginfo|executable)$")
+
+
+def get_build_id_from_path(path):
+    """Recover the build-id from a /usr/lib/debug/.build-id path"""
+    m = build_id_path.match(path)
+    if not m:
+        return None
+    return m.group(1) + m.group(2)
+
+
+class BuildIdIndex:
+    """Maps build-ids to the file within an emitted eopkg holding either
+    the debug information or the executable itself. Entries accumulate
+    across builds, with the most recent build of a build-id winning."""
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS buildids ("
+            "build_id TEXT NOT NULL, kind TEXT NOT NULL, path TEXT NOT NULL, "
+            "package TEXT NOT NULL, version TEXT NOT NULL, eopkg TEXT NOT NULL, "
+            "PRIMARY KEY (build_id, kind))"
+        )
+
+    def add(self, build_id, kind, path, package, version, eopkg):
+        self.db.execute(
+            "INSERT OR REPLACE INTO buildids VALUES (?, ?, ?, ?, ?, ?)",
+            (build_id, kind, path, package, version, eopkg),
+        )
+
+    def lookup(self, build_id, kind):
+        """Return the (path, eopkg) for build_id, or None"""
+        cur = self.db.execute(
+            "SELECT path, eopkg FROM buildids WHERE build_id = ? AND kind = ?",
+            (build_id.lower(), kind),
+        )
+        return cur.fetchone()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+
+def index_build_ids(context, gene, examinations, outputDir, emitted):
+    """Record the build-id of every binary split during examine, pointing
+    at both the binary and its debug file in the emitted packages.
+
+    emitted maps package names to the eopkg file written for them."""
+    version = "{}-{}".format(context.spec.pkg_version, context.spec.pkg_release)
+    count = 0
+    # Hardlinked binaries share a build-id, index the first path only
+    seen = set()
+    index = BuildIdIndex(os.path.join(outputDir, INDEX_NAME))
+    try:
+        for name in sorted(examinations):
+            for info in examinations[name]:
+                if not info.debug_file:
+                    continue
+                build_id = get_build_id_from_path(info.debug_file)
+                if build_id is None or build_id in seen:
+                    continue
+                seen.add(build_id)
+                dbg = gene.get_file_owner(info.debug_file)
+                entries = [
+                    (BUILDID_EXECUTABLE, info.pretty, name),
+                    (BUILDID_DEBUGINFO, info.debug_file, dbg.name if dbg else None),
+                ]
+                for kind, path, owner in entries:
+                    if owner not in emitted:
+                        continue
+                    index.add(
+                        build_id,
+                        kind,
+                        path.lstrip("/"),
+                        context.spec.get_package_name(owner),
+                        version,
+                        emitted[owner],
+                    )
+                count += 1
+    finally:
+        index.close()
+    return count
+
+
+def open_install_member(eopkg, path, depth=0):
+    """Open path from the install archive of eopkg, returning a file
+    object and its size, or None. Hardlinks are followed."""
+    with zipfile.ZipFile(eopkg) as zfile:
+        with zfile.open("install.tar.xz") as tfile:
+            with tarfile.open(fileobj=tfile, mode="r|xz") as archive:
+                for member in archive:
+                    if member.name != path:
+                        continue
+                    if member.islnk() and depth < 8:
+                        return open_install_member(eopkg, member.linkname, depth + 1)
+                    if not member.isfile():
+                        return None
+                    # Stream mode can't seek back, spool it out instead
+                    spool = tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024)
+                    shutil.copyfileobj(archive.extractfile(member), spool)
+                    spool.seek(0)
+                    return spool, member.size
+    return None
+
+
+class DebuginfodHandler(BaseHTTPRequestHandler):
+    """Serves the subset of the debuginfod protocol that is backed by the
+    build-id index: /buildid/<id>/debuginfo and /buildid/<id>/executable"""
+
+    directory = None
+
+    def do_GET(self):
+        m = request_path.match(self.path)
+        if not m:
+            self.send_error(404)
+            return
+
+        index = BuildIdIndex(os.path.join(self.directory, INDEX_NAME))
+        try:
+            found = index.lookup(m.group(1), m.group(2))
+        finally:
+            index.close()
+        if found is None:
+            self.send_error(404)
+            return
+
+        path, eopkg = found
+        eopkg = os.path.join(self.directory, eopkg)
+        try:
+            member = open_install_member(eopkg, path)
+        except Exception as e:
+            console_ui.emit_warning("Serve", "Failed to read {}".format(eopkg))
+            print(e)
+            member = None
+        if member is None:
+            self.send_error(404)
+            return
+
+        fobj, size = member
+        with fobj:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(size))
+            self.send_header("X-DEBUGINFOD-FILE", "/" + path)
+            self.end_headers()
+            shutil.copyfileobj(fobj, self.wfile)
+
+
+def serve_debuginfo(directory, port, bind="127.0.0.1"):
+    """Serve build-ids from the index in directory on the given address
+    until interrupted"""
+    if not os.path.exists(os.path.join(directory, INDEX_NAME)):
+        console_ui.emit_error(
+            "Serve", "No build-id index found in {}".format(directory)
+        )
+        return False
+
+    DebuginfodHandler.directory = directory
+    try:
+        server = ThreadingHTTPServer((bind, port), DebuginfodHandler)
+    except Exception as e:
+        console_ui.emit_error("Serve", "Failed to listen on {}:{}".format(bind, port))
+        print(e)
+        return False
+    console_ui.emit_info(
+        "Serve", "Serving build-ids from {} on {}:{}".format(directory, bind, port)
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return True
@@ -0,0 +1,163 @@
+#!/bin/true
+# -*- coding: utf-8 -*-
+#
+#  This file is part of ypkg2
+#
+#  Copyright 2025 Solus Project
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+
+import hashlib
+import multiprocessing
+import os
+import stat
+
+from .examine import classify_file
+from .util import console_ui
+
+DEDUPE_NONE = "none"
+DEDUPE_HARDLINK = "hardlink"
+DEDUPE_SYMLINK = "symlink"
+
+DEDUPE_MODES = [DEDUPE_NONE, DEDUPE_HARDLINK, DEDUPE_SYMLINK]
+
+
+def hash_file(fpath):
+    """Pool worker, returning the SHA-256 of the file at fpath"""
+    h = hashlib.sha256()
+    try:
+        with open(fpath, "rb") as fd:
+            while True:
+                chunk = fd.read(1024 * 1024)
+                if not chunk:
+                    break
+                h.update(chunk)
+    except Exception as e:
+        print(e)
+        return fpath, None
+    return fpath, h.hexdigest()
+
+
+def get_xattr_key(fpath):
+    """Extended attributes (i.e. file capabilities) must match too, as
+    hardlinks share them"""
+    try:
+        names = sorted(os.listxattr(fpath, follow_symlinks=False))
+        return tuple((x, os.getxattr(fpath, x, follow_symlinks=False)) for x in names)
+    except OSError:
+        return ()
+
+
+def is_dedupe_candidate(package, pretty):
+    """Permanent files and configuration are left well alone"""
+    if package.is_permanent(pretty):
+        return False
+    if pretty.startswith("/etc/"):
+        return False
+    return True
+
+
+def replace_duplicate(mode, source, dest):
+    """Replace dest with a link to the identical file at source"""
+    tmp = dest + ".ypkg-dedupe"
+    if mode == DEDUPE_SYMLINK:
+        os.symlink(os.path.relpath(source, os.path.dirname(dest)), tmp)
+    else:
+        os.link(source, tmp)
+    os.rename(tmp, dest)
+
+
+def will_be_nuked(context, examiner, pretty, fpath):
+    """Whether examine is going to remove the file, in which case it can't
+    be linked to"""
+    try:
+        kind = classify_file(pretty, fpath)
+    except Exception:
+        return False
+    return examiner.should_nuke_file(context, pretty, fpath, kind)
+
+
+def dedupe_packages(context, gene, examiner):
+    """Find byte-identical files within each package of the generator and
+    replace all but the first of them with hardlinks or relative
+    symlinks, according to the dedupe key of the spec.
+
+    Files are only hashed when another candidate in the same package has
+    the same size, mode and ownership. Anything the examiner will remove
+    is left out, so no link is left dangling. Returns the number of files
+    that were replaced, and the number of bytes saved."""
+    mode = context.spec.pkg_dedupe
+    install_dir = context.get_install_dir()
+
+    # Candidate groups, keyed by package and everything a link would share
+    groups = dict()
+    seen = set()
+    for name in sorted(gene.packages):
+        package = gene.packages[name]
+        for pretty in package.emit_files():
+            if not is_dedupe_candidate(package, pretty):
+                continue
+            fpath = os.path.join(install_dir, pretty[1:])
+            try:
+                st = os.lstat(fpath)
+            except Exception:
+                continue
+            if not stat.S_ISREG(st.st_mode) or st.st_size == 0:
+                continue
+            # Already hardlinked with another candidate
+            inode = (st.st_dev, st.st_ino)
+            if inode in seen:
+                continue
+            seen.add(inode)
+            key = (name, st.st_size, st.st_mode, st.st_uid, st.st_gid)
+            groups.setdefault(key, list()).append((pretty, fpath))
+
+    for key in groups:
+        if len(groups[key]) > 1:
+            groups[key] = [
+                x for x in groups[key] if not will_be_nuked(context, examiner, x[0], x[1])
+            ]
+
+    candidates = [x for key in groups if len(groups[key]) > 1 for x in groups[key]]
+    if len(candidates) == 0:
+        return 0, 0
+
+    hashes = dict()
+    jobs = max(1, min(context.build.jobcount, len(candidates)))
+    with multiprocessing.Pool(processes=jobs) as pool:
+        for fpath, digest in pool.imap_unordered(
+            hash_file, [x[1] for x in candidates], chunksize=16
+        ):
+            hashes[fpath] = digest
+
+    count = 0
+    saved = 0
+    for key in sorted(groups):
+        if len(groups[key]) < 2:
+            continue
+        by_content = dict()
+        for pretty, fpath in sorted(groups[key]):
+            digest = hashes.get(fpath)
+            if digest is None:
+                continue
+            by_content.setdefault((digest, get_xattr_key(fpath)), list()).append(
+                (pretty, fpath)
+            )
+        for dupes in by_content.values():
+            source = dupes[0][1]
+            for pretty, fpath in dupes[1:]:
+                try:
+                    replace_duplicate(mode, source, fpath)
+                except Exception as e:
+                    console_ui.emit_warning(
+                        "Dedupe", "Failed to deduplicate {}".format(pretty)
+                    )
+                    print(e)
+                    continue
+                count += 1
+                saved += key[1]
+    return count, saved
@@ -13,10 +13,9 @@
 
 import os
 
-from pisi.db.installdb import InstallDB
-from pisi.db.packagedb import PackageDB
-from pisi.db.filesdb import FilesDB
-
+from .libindex import LIBRARY_PATHS, LIBRARY_PATHS32, get_library_index
+from .pisidb import get_filesdb, get_installdb, get_packagedb
+from .pkgconfigcache import PkgconfigProviders
 from .util import console_ui
 
 # Provided historically for our pre-glvnd architecture.
@@ -42,10 +41,6 @@ ExceptionRules = [
 
 
 class DependencyResolver:
-    idb = None
-    pdb = None
-    fdb = None
-
     global_rpaths = set()
     global_rpaths32 = set()
     global_sonames = dict()
@@ -63,24 +58,34 @@ class DependencyResolver:
 
     files_cache = dict()
 
+    # Provider of each distinct (emul32, symbol, rpaths), and the symbols
+    # behind each (package, provider) dependency, for compute_for_packages
+    resolved_symbols = None
+    symbol_table = None
+
     kernel_cache = dict()
 
     deadends = dict()
 
-    # Cached from packagedb
+    # Cached from packagedb, via a pkgconfigcache.PkgconfigProviders
+    providers = None
     pkgConfigs = None
     pkgConfigs32 = None
 
+    # libindex.LibraryIndex of the installed libraries, loaded on demand
+    libindex = None
+    libindex_loaded = False
+
     def search_file(self, fname):
         if fname[0] == "/":
             fname = fname[1:]
         if fname in self.deadends:
             return None
-        if self.fdb.has_file(fname):
-            return self.fdb.get_file(fname)
+        if get_filesdb().has_file(fname):
+            return get_filesdb().get_file(fname)
         # Nasty file conflict crap happened on update and the filesdb
         # is now inconsistent ..
-        ret = self.fdb.search_file(fname)
+        ret = get_filesdb().search_file(fname)
         if len(ret) == 1:
             return ret[0]
         # Just blacklist further lookups here
@@ -88,13 +93,16 @@ class DependencyResolver:
         return None
 
     def __init__(self):
-        """Allows us to do look ups on all packages"""
-        self.idb = InstallDB()
-        self.pdb = PackageDB()
-        self.fdb = FilesDB()
+        """Allows us to do look ups on all packages. The pisi databases are
+        only opened once a lookup needs them, see pisidb"""
 
-        # Cache the pkgconfigs known in the pdb
-        self.pkgConfigs, self.pkgConfigs32 = self.pdb.get_pkgconfig_providers()
+    def get_pkgconfig_providers(self):
+        """Load the pkgconfigs known in the pdb on first use"""
+        if self.providers is None:
+            path = os.path.join(self.ctx.get_build_prefix(), "pkgconfig-providers")
+            self.providers = PkgconfigProviders(path)
+            self.pkgConfigs, self.pkgConfigs32 = self.providers.get_repo_providers()
+        return self.providers
 
     def get_symbol_provider(self, info, symbol):
         """Grab the symbol from the local packages"""
@@ -117,6 +125,16 @@ class DependencyResolver:
                 return self.ctx.spec.get_package_name(pkg.name)
         return None
 
+    def get_library_index_path(self):
+        return os.path.join(self.ctx.get_build_prefix(), "library-index")
+
+    def get_library_index(self):
+        """Load the persistent library index on first use"""
+        if not self.libindex_loaded:
+            self.libindex_loaded = True
+            self.libindex = get_library_index(self.get_library_index_path())
+        return self.libindex
+
     def get_symbol_external(self, info, symbol, paths=None):
         """Get the provider of the required symbol from the files database,
         i.e. installed binary dependencies
@@ -136,41 +154,48 @@ class DependencyResolver:
                 return "libglvnd"
 
         if not paths:
-            paths = ["/usr/lib64", "/usr/lib"]
-            if info.emul32:
-                paths = ["/usr/lib32", "/usr/lib", "/usr/lib64"]
-
+            paths = list(LIBRARY_PATHS32 if info.emul32 else LIBRARY_PATHS)
             if info.rpaths:
                 paths.extend(info.rpaths)
 
+        lpkg = self.search_symbol_paths(symbol, paths)
+        if not lpkg:
+            return None
+
+        if info.emul32:
+            self.bindeps_emul32[symbol] = lpkg
+        else:
+            self.bindeps_cache[symbol] = lpkg
+        return lpkg
+
+    def search_symbol_paths(self, symbol, paths):
+        """Probe the filesystem for symbol in each of paths, in order, and
+        find the owner of the first hit from the library index, or failing
+        that from the files database"""
+        index = self.get_library_index()
         pkg = None
         for path in paths:
             fpath = os.path.join(path, symbol)
             if not os.path.exists(fpath):
                 continue
             lpkg = None
-            if fpath in self.files_cache:
+            if index is not None:
+                lpkg = index.get_owner(fpath)
+            if not lpkg and fpath in self.files_cache:
                 lpkg = self.files_cache[fpath]
-            else:
+            if not lpkg:
                 pkg = self.search_file(fpath)
                 if pkg:
                     lpkg = pkg[0]
+            if lpkg and index is not None:
+                # The rest of its libraries are likely needed too
+                index.add_package(lpkg)
+                return lpkg
             if lpkg:
-                if info.emul32:
-                    self.bindeps_emul32[symbol] = lpkg
-                else:
-                    self.bindeps_cache[symbol] = lpkg
-                console_ui.emit_info(
-                    "Dependency",
-                    "{} adds dependency on {} from {}".format(
-                        info.pretty, symbol, lpkg
-                    ),
-                )
-
                 # Populate a global files cache, basically there is a high
                 # chance that each package depends on multiple things in a
                 # single package.
-                for file in self.idb.get_files(lpkg).list:
+                for file in get_installdb().get_files(lpkg).list:
                     self.files_cache["/" + file.path] = lpkg
                 return lpkg
         return None
@@ -197,30 +222,31 @@ class DependencyResolver:
             if name in self.pkgconfig_cache:
                 return self.pkgconfig_cache[name]
 
+        providers = self.get_pkgconfig_providers()
         if info.emul32:
             # InstallDB set
-            nom = self.fdb.get_pkgconfig32_provider(name)
+            nom = providers.get_installed_provider(name, emul32=True)
             if nom:
-                pkg = self.idb.get_package(nom[0])
+                pkg = get_installdb().get_package(nom[0])
             if not pkg:
-                nom = self.fdb.get_pkgconfig_provider(name)
+                nom = providers.get_installed_provider(name)
                 if nom:
-                    pkg = self.idb.get_package(nom[0])
+                    pkg = get_installdb().get_package(nom[0])
 
             # PackageDB set
             if not pkg:
                 if name in self.pkgConfigs32:
-                    pkg = self.pdb.get_package(self.pkgConfigs32[name])
+                    pkg = get_packagedb().get_package(self.pkgConfigs32[name])
             if not pkg:
                 if name in self.pkgConfigs:
-                    pkg = self.pdb.get_package(self.pkgConfigs[name])
+                    pkg = get_packagedb().get_package(self.pkgConfigs[name])
         else:
-            nom = self.fdb.get_pkgconfig_provider(name)
+            nom = providers.get_installed_provider(name)
             if nom:
-                pkg = self.idb.get_package(nom[0])
+                pkg = get_installdb().get_package(nom[0])
             if not pkg:
                 if name in self.pkgConfigs:
-                    pkg = self.pdb.get_package(self.pkgConfigs[name])
+                    pkg = get_packagedb().get_package(self.pkgConfigs[name])
 
         if not pkg:
             return None
@@ -230,21 +256,69 @@ class DependencyResolver:
             self.pkgconfig_cache[name] = pkg.name
         return pkg.name
 
-    def handle_binary_deps(self, packageName, info):
-        """Handle direct binary dependencies"""
-        pkgName = self.ctx.spec.get_package_name(packageName)
+    def get_symbol_key(self, info, symbol):
+        """Everything the provider of a symbol depends upon"""
+        rpaths = tuple(sorted(info.rpaths)) if info.rpaths else ()
+        return info.emul32, symbol, rpaths
 
-        for sym in info.symbol_deps:
+    def resolve_symbols(self, packageSet):
+        """Resolve each distinct symbol required across all packages once,
+        rather than once for every binary needing it. The local packages
+        are tried first, then the installed ones."""
+        keys = dict()
+        for packageName in packageSet:
+            for info in packageSet[packageName]:
+                if not info.symbol_deps:
+                    continue
+                for sym in info.symbol_deps:
+                    key = self.get_symbol_key(info, sym)
+                    # Any info with the same key will resolve the same
+                    if key not in keys:
+                        keys[key] = info
+
+        resolved = dict()
+        for key in sorted(keys):
+            info = keys[key]
+            sym = key[1]
             r = self.get_symbol_provider(info, sym)
             if not r:
                 r = self.get_symbol_external(info, sym)
                 if not r:
                     print(("Fatal: Unknown symbol: {}".format(sym)))
-                    continue
+            resolved[key] = r
+        return resolved
+
+    def handle_binary_deps(self, packageName, info):
+        """Handle direct binary dependencies"""
+        pkgName = self.ctx.spec.get_package_name(packageName)
+
+        for sym in info.symbol_deps:
+            r = self.resolved_symbols[self.get_symbol_key(info, sym)]
+            if not r:
+                continue
             # Don't self depend
             if pkgName == r:
                 continue
             self.gene.packages[packageName].depend_packages.add(r)
+            self.symbol_table.setdefault((pkgName, r), set()).add(sym)
+
+    def report_binary_deps(self):
+        """Summarise the binary dependencies found as a single table"""
+        if len(self.symbol_table) == 0:
+            return
+        rows = list()
+        for pkgName, provider in sorted(self.symbol_table):
+            syms = sorted(self.symbol_table[(pkgName, provider)])
+            rows.append((pkgName, provider, ", ".join(syms)))
+        pkgWidth = max(len(x[0]) for x in rows)
+        provWidth = max(len(x[1]) for x in rows)
+        for pkgName, provider, syms in rows:
+            console_ui.emit_info(
+                "Dependency",
+                "{} -> {} ({})".format(
+                    pkgName.ljust(pkgWidth), provider.ljust(provWidth), syms
+                ),
+            )
 
     def handle_pkgconfig_deps(self, packageName, info):
         """Handle pkgconfig dependencies"""
@@ -346,7 +420,7 @@ class DependencyResolver:
                 # Populate a global files cache, basically there is a high
                 # chance that each package depends on multiple things in a
                 # single package.
-                for file in self.idb.get_files(lpkg).list:
+                for file in get_installdb().get_files(lpkg).list:
                     self.files_cache["/" + file.path] = lpkg
                 return lpkg
         return None
@@ -394,6 +468,9 @@ class DependencyResolver:
                 if info.prov_kernel:
                     self.global_kernels[info.prov_kernel] = packageName
 
+        self.resolved_symbols = self.resolve_symbols(packageSet)
+        self.symbol_table = dict()
+
         # Ok now find the dependencies
         for packageName in packageSet:
             for info in packageSet[packageName]:
@@ -411,4 +488,22 @@ class DependencyResolver:
 
                 if info.dep_kernel:
                     self.handle_kernel_deps(packageName, info)
+
+        self.report_binary_deps()
+
+        if self.libindex is not None:
+            try:
+                self.libindex.save(self.get_library_index_path())
+            except Exception as e:
+                console_ui.emit_warning("Dependency", "Failed to save library index")
+                print(e)
+
+        if self.providers is not None:
+            try:
+                self.providers.save()
+            except Exception as e:
+                console_ui.emit_warning(
+                    "PKGCONFIG", "Failed to save pkgconfig provider snapshot"
+                )
+                print(e)
         return True
@@ -0,0 +1,393 @@
+#!/bin/true
+# -*- coding: utf-8 -*-
+#
+#  This file is part of ypkg2
+#
+#  Copyright 2025 Solus Project
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+
+import mmap
+import os
+import struct
+
+ELF_MAGIC = b"\x7fELF"
+
+ELFCLASS32 = 1
+ELFCLASS64 = 2
+
+ELFDATA2LSB = 1
+ELFDATA2MSB = 2
+
+ET_REL = 1
+ET_EXEC = 2
+ET_DYN = 3
+
+PT_LOAD = 1
+PT_DYNAMIC = 2
+PT_NOTE = 4
+
+SHT_SYMTAB = 2
+SHT_DYNAMIC = 6
+SHT_NOTE = 7
+
+SHN_XINDEX = 0xFFFF
+
+SHF_COMPRESSED = 0x800
+
+DT_NULL = 0
+DT_NEEDED = 1
+DT_STRTAB = 5
+DT_SONAME = 14
+DT_RPATH = 15
+DT_RUNPATH = 29
+DT_FLAGS_1 = 0x6FFFFFFB
+
+DF_1_PIE = 0x08000000
+
+NT_GNU_BUILD_ID = 3
+
+# Sections holding debug information, compressed or otherwise
+DEBUG_SECTION_PREFIXES = (".debug_", ".zdebug_", ".stab", ".gdb_index")
+
+# Layouts for the fixed-size ELF structures, without the byte order prefix
+_ehdr = {ELFCLASS32: "HHIIIIIHHHHHH", ELFCLASS64: "HHIQQQIHHHHHH"}
+_phdr = {ELFCLASS32: "IIIIIIII", ELFCLASS64: "IIQQQQQQ"}
+_shdr = {ELFCLASS32: "IIIIIIIIII", ELFCLASS64: "IIQQQQIIQQ"}
+_dyn = {ELFCLASS32: "iI", ELFCLASS64: "qQ"}
+_chdr = {ELFCLASS32: "III", ELFCLASS64: "IIQQ"}
+
+
+class ElfError(Exception):
+    """Raised when a file cannot be parsed as an ELF object"""
+
+    pass
+
+
+class ProgramHeader:
+    """A single entry of the program header table"""
+
+    def __init__(self, p_type, p_offset, p_vaddr, p_filesz, p_align):
+        self.p_type = p_type
+        self.p_offset = p_offset
+        self.p_vaddr = p_vaddr
+        self.p_filesz = p_filesz
+        self.p_align = p_align
+
+
+class SectionHeader:
+    """A single entry of the section header table"""
+
+    name = None
+
+    def __init__(self, sh_name, sh_type, sh_flags, sh_offset, sh_size, sh_link, sh_addralign):
+        self.sh_name = sh_name
+        self.sh_type = sh_type
+        self.sh_flags = sh_flags
+        self.sh_offset = sh_offset
+        self.sh_size = sh_size
+        self.sh_link = sh_link
+        self.sh_addralign = sh_addralign
+
+
+class DynamicInfo:
+    """Interesting bits of the dynamic section, as readelf -d reports them"""
+
+    def __init__(self):
+        self.needed = list()
+        self.soname = None
+        self.rpath = None
+        self.runpath = None
+
+
+class ElfFile:
+    """Minimal read-only ELF reader operating on an in-memory buffer,
+    typically a read-only mmap of the file, to avoid spawning binutils
+    for every object we examine."""
+
+    def __init__(self, buf, name=None):
+        self.buf = buf
+        self.name = name
+        self._mmap = None
+        self._phdrs = None
+        self._shdrs = None
+
+        if len(buf) < 52 or buf[0:4] != ELF_MAGIC:
+            raise ElfError("Not an ELF file: {}".format(name))
+
+        self.elf_class = buf[4]
+        if self.elf_class not in (ELFCLASS32, ELFCLASS64):
+            raise ElfError("Unknown ELF class {} in {}".format(self.elf_class, name))
+        if buf[5] == ELFDATA2LSB:
+            self.endian = "<"
+        elif buf[5] == ELFDATA2MSB:
+            self.endian = ">"
+        else:
+            raise ElfError("Unknown ELF data encoding in {}".format(name))
+
+        (
+            self.e_type,
+            self.e_machine,
+            _,
+            _,
+            self.e_phoff,
+            self.e_shoff,
+            _,
+            _,
+            self.e_phentsize,
+            self.e_phnum,
+            self.e_shentsize,
+            self.e_shnum,
+            self.e_shstrndx,
+        ) = self._unpack(_ehdr, 16)
+
+    def _unpack(self, layouts, offset):
+        fmt = self.endian + layouts[self.elf_class]
+        try:
+            return struct.unpack_from(fmt, self.buf, offset)
+        except struct.error:
+            raise ElfError("Truncated ELF file: {}".format(self.name))
+
+    def close(self):
+        """Release the underlying mapping, if we own one"""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self.buf = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def is_64bit(self):
+        return self.elf_class == ELFCLASS64
+
+    def get_string(self, offset):
+        """Return the NUL terminated string at the given file offset"""
+        end = self.buf.find(b"\0", offset)
+        if end < 0:
+            raise ElfError("Unterminated string in {}".format(self.name))
+        return bytes(self.buf[offset:end]).decode("utf-8", errors="replace")
+
+    def get_program_headers(self):
+        """Parse the program header table on first use"""
+        if self._phdrs is not None:
+            return self._phdrs
+        self._phdrs = list()
+        if self.e_phoff == 0:
+            return self._phdrs
+        for i in range(0, self.e_phnum):
+            off = self.e_phoff + i * self.e_phentsize
+            hdr = self._unpack(_phdr, off)
+            if self.is_64bit():
+                p_type, _, p_offset, p_vaddr, _, p_filesz, _, p_align = hdr
+            else:
+                p_type, p_offset, p_vaddr, _, p_filesz, _, _, p_align = hdr
+            self._phdrs.append(ProgramHeader(p_type, p_offset, p_vaddr, p_filesz, p_align))
+        return self._phdrs
+
+    def get_section_headers(self):
+        """Parse the section header table on first use, resolving names"""
+        if self._shdrs is not None:
+            return self._shdrs
+        self._shdrs = list()
+        if self.e_shoff == 0:
+            return self._shdrs
+
+        def read_shdr(index):
+            off = self.e_shoff + index * self.e_shentsize
+            hdr = self._unpack(_shdr, off)
+            return SectionHeader(hdr[0], hdr[1], hdr[2], hdr[4], hdr[5], hdr[6], hdr[8])
+
+        # Large section counts spill into the initial entry
+        shnum = self.e_shnum
+        shstrndx = self.e_shstrndx
+        if shnum == 0 or shstrndx == SHN_XINDEX:
+            first = read_shdr(0)
+            if shnum == 0:
+                shnum = first.sh_size
+            if shstrndx == SHN_XINDEX:
+                shstrndx = first.sh_link
+
+        self._shdrs = [read_shdr(i) for i in range(0, shnum)]
+        if shstrndx < len(self._shdrs):
+            strtab = self._shdrs[shstrndx].sh_offset
+            for shdr in self._shdrs:
+                shdr.name = self.get_string(strtab + shdr.sh_name)
+        return self._shdrs
+
+    def get_section(self, name):
+        """Return the first section header with the given name"""
+        for shdr in self.get_section_headers():
+            if shdr.name == name:
+                return shdr
+        return None
+
+    def get_section_data(self, name):
+        """Return the raw contents of the named section, or None"""
+        shdr = self.get_section(name)
+        if shdr is None:
+            return None
+        if shdr.sh_offset + shdr.sh_size > len(self.buf):
+            raise ElfError("Truncated section {} in {}".format(name, self.name))
+        return bytes(self.buf[shdr.sh_offset : shdr.sh_offset + shdr.sh_size])
+
+    def get_uncompressed_size(self):
+        """Size of the file were every SHF_COMPRESSED section inflated, by
+        way of the compression headers"""
+        size = len(self.buf)
+        for shdr in self.get_section_headers():
+            if not shdr.sh_flags & SHF_COMPRESSED:
+                continue
+            chdr = self._unpack(_chdr, shdr.sh_offset)
+            # ch_size follows ch_type, and ch_reserved on 64-bit
+            size += chdr[2 if self.is_64bit() else 1] - shdr.sh_size
+        return size
+
+    def is_stripped(self):
+        """Whether there is neither a symbol table nor any debug
+        information left in the file, i.e. nothing for strip to remove"""
+        for shdr in self.get_section_headers():
+            if shdr.sh_type == SHT_SYMTAB:
+                return False
+            if shdr.name and shdr.name.startswith(DEBUG_SECTION_PREFIXES):
+                return False
+        return True
+
+    def vaddr_to_offset(self, vaddr):
+        """Translate a virtual address into a file offset via PT_LOAD"""
+        for phdr in self.get_program_headers():
+            if phdr.p_type != PT_LOAD:
+                continue
+            if phdr.p_vaddr <= vaddr < phdr.p_vaddr + phdr.p_filesz:
+                return vaddr - phdr.p_vaddr + phdr.p_offset
+        return None
+
+    def get_dynamic_entries(self):
+        """Return the (tag, value) pairs of the dynamic section, and the
+        file offset of the string table they refer to"""
+        dyn_off = None
+        dyn_size = 0
+        for phdr in self.get_program_headers():
+            if phdr.p_type == PT_DYNAMIC:
+                dyn_off = phdr.p_offset
+                dyn_size = phdr.p_filesz
+                break
+
+        strtab = None
+        if dyn_off is None:
+            # Relocatable objects only carry sections
+            for shdr in self.get_section_headers():
+                if shdr.sh_type == SHT_DYNAMIC:
+                    dyn_off = shdr.sh_offset
+                    dyn_size = shdr.sh_size
+                    if shdr.sh_link < len(self._shdrs):
+                        strtab = self._shdrs[shdr.sh_link].sh_offset
+                    break
+        if dyn_off is None:
+            return list(), None
+
+        entsize = struct.calcsize(self.endian + _dyn[self.elf_class])
+        entries = list()
+        for off in range(dyn_off, dyn_off + dyn_size, entsize):
+            tag, val = self._unpack(_dyn, off)
+            if tag == DT_NULL:
+                break
+            entries.append((tag, val))
+            if tag == DT_STRTAB and strtab is None:
+                strtab = self.vaddr_to_offset(val)
+        return entries, strtab
+
+    def get_dynamic_info(self):
+        """Collect DT_NEEDED, DT_SONAME, DT_RPATH and DT_RUNPATH"""
+        info = DynamicInfo()
+        entries, strtab = self.get_dynamic_entries()
+        if not entries:
+            return info
+        if strtab is None:
+            raise ElfError("No dynamic string table in {}".format(self.name))
+
+        for tag, val in entries:
+            if tag == DT_NEEDED:
+                info.needed.append(self.get_string(strtab + val))
+            elif tag == DT_SONAME:
+                info.soname = self.get_string(strtab + val)
+            elif tag == DT_RPATH:
+                info.rpath = self.get_string(strtab + val)
+            elif tag == DT_RUNPATH:
+                info.runpath = self.get_string(strtab + val)
+        return info
+
+    def is_pie(self):
+        """Position independent executables are ET_DYN objects just like
+        shared libraries. As libmagic does, trust the DF_1_PIE flag."""
+        if self.e_type != ET_DYN:
+            return False
+        entries, _ = self.get_dynamic_entries()
+        for tag, val in entries:
+            if tag == DT_FLAGS_1:
+                return bool(val & DF_1_PIE)
+        return False
+
+    def iter_notes(self):
+        """Yield (name, type, desc) for every note in the note segments, or
+        the note sections for relocatable objects without program headers"""
+        regions = [
+            (p.p_offset, p.p_filesz, p.p_align)
+            for p in self.get_program_headers()
+            if p.p_type == PT_NOTE
+        ]
+        if not regions:
+            regions = [
+                (s.sh_offset, s.sh_size, s.sh_addralign)
+                for s in self.get_section_headers()
+                if s.sh_type == SHT_NOTE
+            ]
+
+        for start, size, align in regions:
+            # Notes are 4 byte aligned, except in 8 byte aligned note
+            # segments, where the name is still only padded to 4 and the
+            # descriptor and next note are 8 byte aligned, as gelf_getnote
+            align = 8 if align == 8 else 4
+            off = start
+            end = start + size
+            while off + 12 <= end:
+                namesz, descsz, ntype = struct.unpack_from(self.endian + "III", self.buf, off)
+                off += 12
+                name = bytes(self.buf[off : off + namesz]).rstrip(b"\0")
+                off = (off + namesz + align - 1) & ~(align - 1)
+                desc = bytes(self.buf[off : off + descsz])
+                off = (off + descsz + align - 1) & ~(align - 1)
+                if off > end:
+                    break
+                yield name, ntype, desc
+
+    def get_build_id(self):
+        """Return the raw NT_GNU_BUILD_ID bytes, or None if there are none"""
+        for name, ntype, desc in self.iter_notes():
+            if name == b"GNU" and ntype == NT_GNU_BUILD_ID and desc:
+                return desc
+        return None
+
+
+def open_elf(path):
+    """Map the file at path read-only and wrap it in an ElfFile. The caller
+    should close() it, or use it as a context manager."""
+    with open(path, "rb") as fd:
+        size = os.fstat(fd.fileno()).st_size
+        if size == 0:
+            raise ElfError("Empty file: {}".format(path))
+        mapping = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        efile = ElfFile(mapping, name=path)
+    except Exception:
+        mapping.close()
+        raise
+    efile._mmap = mapping
+    return efile
@@ -15,30 +15,149 @@
 import magic
 import re
 import os
+import stat
 import subprocess
 import shutil
 import multiprocessing
 import xattr
 import base64
+import lzma
+import tempfile
 
-from .util import console_ui, readlink, remove_prefix, EMUL32PC
+from datetime import timedelta
+from humanize import naturalsize
+from timeit import default_timer as timer
+
+from .debuginfo import compress_debug, fix_debuglink, get_split_compression
+from .elf import ELF_MAGIC, ET_DYN, ET_EXEC, ET_REL, open_elf
+from .kmod import get_vermagic, is_compressed_module
+from .pkgconfig import load_pkgconfig
+from .timings import ExamineProfile, begin_file, end_file, set_enabled, timed
+from .util import console_ui, readlink, remove_prefix
 
 global share_ctx
+global share_examiner
 
 
 v_dyn = re.compile(r".*ELF (64|32)\-bit LSB shared object,")
 v_bin = re.compile(r".*ELF (64|32)\-bit LSB executable,")
 v_pie = re.compile(r".*ELF (64|32)\-bit LSB pie executable,")
 v_rel = re.compile(r".*ELF (64|32)\-bit LSB relocatable,")
-shared_lib = re.compile(r".*Shared library: \[(.*)\].*")
-r_path = re.compile(r".*Library rpath: \[(.*)\].*")
-run_path = re.compile(r".*Library runpath: \[(.*)\].*")
-r_soname = re.compile(r".*Library soname: \[(.*)\].*")
+v_libtool = re.compile(r"libtool library file, ASCII text.*")
+
+# How debug information is split out of binaries prior to stripping
+STRIP_MODE_AUTO = "auto"
+STRIP_MODE_SEPARATE = "separate"
+STRIP_MODE_COMBINED = "combined"
+
+# Enough of the header to tell apart everything we care about
+SNIFF_SIZE = 512
 
 global_xattrs = dict()
 
 
-def is_pkgconfig_file(pretty, mgs):
+class FileKind:
+    """What a file in the install tree is, as far as examine is concerned"""
+
+    OTHER = 0
+    DIRECTORY = 1
+    SYMLINK = 2
+    ELF_SHARED = 3
+    ELF_EXEC = 4
+    ELF_PIE = 5
+    ELF_REL = 6
+    AR_ARCHIVE = 7
+    LIBTOOL = 8
+    ASCII_TEXT = 9
+
+    @staticmethod
+    def is_elf(kind):
+        """Any ELF object type we know how to strip and scan"""
+        return kind in (
+            FileKind.ELF_SHARED,
+            FileKind.ELF_EXEC,
+            FileKind.ELF_PIE,
+            FileKind.ELF_REL,
+        )
+
+    @staticmethod
+    def from_magic(mgs):
+        """Map a libmagic description onto a kind"""
+        if v_dyn.match(mgs):
+            return FileKind.ELF_SHARED
+        if v_bin.match(mgs):
+            return FileKind.ELF_EXEC
+        if v_pie.match(mgs):
+            return FileKind.ELF_PIE
+        if v_rel.match(mgs):
+            return FileKind.ELF_REL
+        if mgs == "current ar archive":
+            return FileKind.AR_ARCHIVE
+        if v_libtool.match(mgs):
+            return FileKind.LIBTOOL
+        if mgs == "ASCII text":
+            return FileKind.ASCII_TEXT
+        return FileKind.OTHER
+
+
+def magic_from_file(file):
+    """libmagic, accounted separately in the examine profile"""
+    with timed("libmagic"):
+        return magic.from_file(file)
+
+
+def classify_elf(file):
+    """Determine the ELF object type from the headers alone"""
+    with open_elf(file) as efile:
+        # Historically only little endian objects were considered
+        if efile.endian != "<":
+            return FileKind.OTHER
+        if efile.e_type == ET_EXEC:
+            return FileKind.ELF_EXEC
+        if efile.e_type == ET_REL:
+            return FileKind.ELF_REL
+        if efile.e_type == ET_DYN:
+            if efile.is_pie():
+                return FileKind.ELF_PIE
+            return FileKind.ELF_SHARED
+    return FileKind.OTHER
+
+
+def classify_file(pretty, file, st=None):
+    """Classify a file by sniffing its header, only deferring to libmagic
+    for the few cases where the header is not conclusive"""
+    if st is None:
+        st = os.lstat(file)
+    if stat.S_ISLNK(st.st_mode):
+        return FileKind.SYMLINK
+    if stat.S_ISDIR(st.st_mode):
+        return FileKind.DIRECTORY
+    if not stat.S_ISREG(st.st_mode):
+        return FileKind.OTHER
+
+    with open(file, "rb") as fd:
+        head = fd.read(SNIFF_SIZE)
+
+    if head.startswith(ELF_MAGIC):
+        try:
+            return classify_elf(file)
+        except Exception:
+            # Damaged or truncated, let libmagic have its say
+            return FileKind.from_magic(magic_from_file(file))
+    if head.startswith(b"!<arch>\n"):
+        if head[8:].startswith(b"debian-binary"):
+            return FileKind.OTHER
+        return FileKind.AR_ARCHIVE
+
+    # Text classification needs the whole file, leave it to libmagic
+    if b".la - a libtool library file" in head[0:80]:
+        return FileKind.from_magic(magic_from_file(file))
+    if "kernel/System.map-" in pretty:
+        return FileKind.from_magic(magic_from_file(file))
+    return FileKind.OTHER
+
+
+def is_pkgconfig_file(pretty, kind):
     """Simple as it sounds, work out if this is a pkgconfig file"""
     if pretty.endswith(".pc"):
         pname = os.path.basename(os.path.dirname(pretty))
@@ -47,75 +166,104 @@ def is_pkgconfig_file(pretty, mgs):
     return False
 
 
-def is_soname_link(file, mgs):
+def is_soname_link(file, kind):
     """Used to detect soname links"""
     if not file.endswith(".so"):
         return False
 
-    if os.path.islink(file) and not os.path.isdir(file):
+    if kind == FileKind.SYMLINK and not os.path.isdir(file):
         return True
     return False
 
 
-def is_static_archive(file, mgs):
+def is_static_archive(file, kind):
     """Very trivially determine .a files"""
     if not file.endswith(".a"):
         return False
 
-    if mgs != "current ar archive":
-        return False
+    return kind == FileKind.AR_ARCHIVE
 
-    if os.path.islink(file) or os.path.isdir(file):
-        return False
 
-    return True
+def is_emul32_path(pretty):
+    return pretty.startswith("/usr/lib32/") or pretty.startswith("/lib32")
 
 
-def is_system_map(file, mgs):
+def is_system_map(file, kind):
     """Ensure we have a system map file"""
     if "kernel/System.map-" not in file:
         return False
 
-    if mgs != "ASCII text":
-        return False
-
-    if os.path.islink(file) or os.path.isdir(file):
-        return False
-
-    return True
+    return kind == FileKind.ASCII_TEXT
 
 
 class FileReport:
-    pkgconfig_deps = None
-    pkgconfig_name = None
-
-    emul32 = False
-
-    soname = None
-    symbol_deps = None
-
-    rpaths = None
-
-    soname_links = None
-
-    xattrs = None
-
-    # Dependent kernel versions
-    dep_kernel = None
-    prov_kernel = None
+    """Results of examining a single file. One of these crosses the pool
+    boundary for every file of interest and all of them are kept until
+    packaging completes, so they are kept as compact as possible."""
+
+    __slots__ = (
+        "pretty",
+        "pkgconfig_deps",
+        "pkgconfig_name",
+        "emul32",
+        "soname",
+        "symbol_deps",
+        "rpaths",
+        "soname_links",
+        "xattrs",
+        # Wall time spent splitting and stripping, tool runs avoided, and
+        # whether the strip cache was hit
+        "strip_time",
+        "strip_saved",
+        "strip_cached",
+        # Nothing to strip, as the file was already stripped
+        "strip_skipped",
+        # Split debug file, relative to the install directory
+        "debug_file",
+        # Wall time per examine sub-operation for this file
+        "timings",
+        # Dependent kernel versions
+        "dep_kernel",
+        "prov_kernel",
+    )
+
+    def make_alias(self, pretty):
+        """Duplicate this report for another hardlink to the same file,
+        which has not itself been stripped or timed"""
+        alias = FileReport.__new__(FileReport)
+        alias.__setstate__(self.__getstate__())
+        alias.pretty = pretty
+        alias.emul32 = is_emul32_path(pretty)
+        alias.strip_time = None
+        alias.strip_saved = 0
+        alias.strip_cached = None
+        alias.strip_skipped = False
+        alias.timings = None
+        return alias
+
+    def __getstate__(self):
+        # Plain values in slot order, without repeating the names for
+        # every report sent back from the pool
+        return tuple(getattr(self, x) for x in FileReport.__slots__)
+
+    def __setstate__(self, state):
+        for key, value in zip(FileReport.__slots__, state):
+            setattr(self, key, value)
 
     def scan_kernel(self, file):
-        """Scan a .ko file to figure out which kernel this depends on"""
-        cmd = 'LC_ALL=C /sbin/modinfo --field=vermagic "{}"'.format(file)
+        """Read the vermagic of a .ko file to figure out which kernel this
+        depends on"""
         try:
-            output = subprocess.check_output(cmd, shell=True)
+            vermagic = get_vermagic(file)
         except Exception as e:
             console_ui.emit_warning(
                 "File", "Failed to scan kernel modules for path: {}".format(file)
             )
+            print(e)
+            return
+        if not vermagic:
             return
-        line = output.split("\n")[0]
-        splits = line.strip().split(" ")
+        splits = vermagic.strip().split(" ")
         if "modversions" not in splits:
             return
         if "mod_unload" not in splits:
@@ -123,106 +271,54 @@ class FileReport:
         self.dep_kernel = splits[0].strip()
 
     def scan_binary(self, file, check_soname=False):
-        cmd = 'LC_ALL=C /usr/bin/readelf -d "{}"'.format(file)
+        """Read the dynamic section directly to find direct dependencies,
+        rpaths and (optionally) the soname of this binary"""
         try:
-            output = subprocess.check_output(cmd, shell=True).decode()
+            with open_elf(file) as efile:
+                dyn = efile.get_dynamic_info()
         except Exception as e:
             console_ui.emit_warning(
                 "File", "Failed to scan binary deps for path: {}".format(file)
             )
             return
 
-        for line in output.split("\n"):
-            line = line.strip()
-
-            # Match rpath
-            r = r_path.match(line)
-            if r:
-                if self.rpaths is None:
-                    self.rpaths = set()
-                self.rpaths.update(r.group(1).split(":"))
+        for rpath in (dyn.rpath, dyn.runpath):
+            if rpath is None:
                 continue
+            if self.rpaths is None:
+                self.rpaths = set()
+            self.rpaths.update(rpath.split(":"))
 
-            # Also check runpath
-            r2 = run_path.match(line)
-            if r2:
-                if self.rpaths is None:
-                    self.rpaths = set()
-                self.rpaths.update(r2.group(1).split(":"))
-                continue
+        if dyn.needed:
+            if self.symbol_deps is None:
+                self.symbol_deps = set()
+            self.symbol_deps.update(dyn.needed)
 
-            # Match direct needed dependency
-            m = shared_lib.match(line)
-            if m:
-                if self.symbol_deps is None:
-                    self.symbol_deps = set()
-                self.symbol_deps.add(m.group(1))
-                continue
-
-            # Check the soname for this binary file
-            if check_soname:
-                so = r_soname.match(line)
-                if so:
-                    self.soname = so.group(1)
+        # Check the soname for this binary file
+        if check_soname and dyn.soname:
+            self.soname = dyn.soname
 
     def scan_pkgconfig(self, file):
-        sub = ""
-        pcDir = os.path.dirname(file)
-        pcPaths = []
-        # Ensure we account for private pkgconfig deps too
-        if self.emul32:
-            pcPaths.append(os.path.join(pcDir, "../../lib32/pkgconfig"))
-            pcPaths.append(EMUL32PC)
-        else:
-            pcPaths.append(os.path.join(pcDir, "../../lib64/pkgconfig"))
-            pcPaths.append(os.path.join(pcDir, "../../lib/pkgconfig"))
-        pcPaths.append(os.path.join(pcDir, "../../share/pkgconfig"))
-        pkgConfigPaths = []
-        for path in pcPaths:
-            p = os.path.abspath(path)
-            if p and os.path.exists(p) and p not in pkgConfigPaths:
-                pkgConfigPaths.append(p)
-
-        if len(pkgConfigPaths) > 0:
-            sub = 'PKG_CONFIG_PATH="{}" '.format(":".join(pkgConfigPaths))
-
-        cmds = [
-            'LC_ALL=C {}pkg-config --print-requires "{}"',
-            'LC_ALL=C {}pkg-config --print-requires-private "{}"',
-        ]
-
+        """Parse the .pc file directly for the name, and the names of both
+        the public and private requirements"""
         pcname = os.path.basename(file).split(".pc")[0]
         self.pkgconfig_name = pcname
 
-        if not share_ctx.spec.pkg_autodep:
+        try:
+            pc = load_pkgconfig(file)
+        except Exception as e:
+            console_ui.emit_warning(
+                "File", "Failed to parse pkgconfig file: {}".format(file)
+            )
+            print(e)
             return
-        for cmd in cmds:
-            try:
-                out = subprocess.check_output(
-                    cmd.format(sub, file), shell=True
-                ).decode()
-            except Exception as e:
-                print(e)
-                continue
-            for line in out.split("\n"):
-                line = line.strip()
 
-                if line == "":
-                    continue
-                name = None
-                # In future we'll do something useful with versions
-                if ">=" in line:
-                    name = line.split(">=")[0]
-                elif "=" in line:
-                    # This is an internal dependency
-                    name = line.split("=")[0]
-                else:
-                    name = line
-                name = name.strip()
-
-                if not self.pkgconfig_deps:
-                    self.pkgconfig_deps = set()
-                self.pkgconfig_deps.add(name)
+        if not share_ctx.spec.pkg_autodep:
+            return
+        for req in pc.get_requires() + pc.get_requires_private():
+            if not self.pkgconfig_deps:
+                self.pkgconfig_deps = set()
+            self.pkgconfig_deps.add(req.name)
 
     def add_solink(self, file, pretty):
         """.so links are almost always split into -devel subpackages in ypkg,
@@ -243,11 +339,11 @@ class FileReport:
         fobj = os.path.join(dirn, fpath)
 
         try:
-            mg = magic.from_file(fobj)
+            kind = classify_file(fobj, fobj)
         except Exception as e:
             return
 
-        if not v_dyn.match(mg):
+        if kind != FileKind.ELF_SHARED:
             return
         fpath = remove_prefix(fobj, share_ctx.get_install_dir())
         if not self.soname_links:
@@ -257,36 +353,55 @@ class FileReport:
     def add_kernel_prov(self, file):
         self.prov_kernel = str(file.split("System.map-")[1])
 
-    def __init__(self, pretty, file, mgs):
+    def __init__(self, pretty, file, kind):
         global share_ctx
         self.pretty = pretty
-        self.file = file
-
-        if pretty.startswith("/usr/lib32/") or pretty.startswith("/lib32"):
+        self.pkgconfig_deps = None
+        self.pkgconfig_name = None
+        self.emul32 = False
+        self.soname = None
+        self.symbol_deps = None
+        self.rpaths = None
+        self.soname_links = None
+        self.xattrs = None
+        self.strip_time = None
+        self.strip_saved = 0
+        self.strip_cached = None
+        self.strip_skipped = False
+        self.debug_file = None
+        self.timings = None
+        self.dep_kernel = None
+        self.prov_kernel = None
+
+        if is_emul32_path(pretty):
             self.emul32 = True
-        if is_pkgconfig_file(pretty, mgs):
-            self.scan_pkgconfig(file)
-        if is_system_map(pretty, mgs):
+        if is_pkgconfig_file(pretty, kind):
+            with timed("pkgconfig"):
+                self.scan_pkgconfig(file)
+        if is_system_map(pretty, kind):
             self.add_kernel_prov(file)
 
         # Some things omit automatic dependencies
         if share_ctx.spec.pkg_autodep:
-            if is_soname_link(file, mgs):
-                self.add_solink(file, pretty)
-            elif v_dyn.match(mgs):
-                self.scan_binary(file, True)
-            elif v_bin.match(mgs):
-                self.scan_binary(file, False)
-            elif v_pie.match(mgs):
-                self.scan_binary(file, False)
-            elif v_rel.match(mgs) and file.endswith(".ko"):
-                self.scan_kernel(file)
-
-
-def strip_file(context, pretty, file, magic_string, mode=None):
-    """Schedule a strip, basically."""
-    if not context.spec.pkg_strip:
-        return
+            if is_soname_link(file, kind):
+                with timed("solink"):
+                    self.add_solink(file, pretty)
+            elif kind == FileKind.ELF_SHARED:
+                with timed("elf"):
+                    self.scan_binary(file, True)
+            elif kind == FileKind.ELF_EXEC or kind == FileKind.ELF_PIE:
+                with timed("elf"):
+                    self.scan_binary(file, False)
+            elif kind == FileKind.ELF_REL and file.endswith(".ko"):
+                with timed("modinfo"):
+                    self.scan_kernel(file)
+            elif is_compressed_module(file):
+                with timed("modinfo"):
+                    self.scan_kernel(file)
+
+
+def get_strip_exports(context):
+    """Environment for the strip tools, matching the toolchain in use"""
     exports = ["LC_ALL=C"]
     if context.spec.pkg_optimize and not context.spec.pkg_clang:
         if (
@@ -297,7 +412,18 @@ def strip_file(context, pretty, file, magic_string, mode=None):
     else:
         if context.spec.pkg_clang:
             exports.extend(['AR="llvm-ar"', 'RANLIB="llvm-ranlib"', 'NM="llvm-nm"'])
+    return exports
+
+
+def strip_file(context, pretty, file, kind, mode=None, debug_file=None):
+    """Schedule a strip, basically. When a debug_file is given the debug
+    information is split out into it, linked and stripped in one eu-strip
+    pass instead of separate objcopy and strip rewrites."""
+    if not context.spec.pkg_strip:
+        return True
+    exports = get_strip_exports(context)
 
+    tool = "strip"
     cmd = '{} strip {} "{}"'
     flags = ""
     if mode == "shared":
@@ -307,36 +433,152 @@ def strip_file(context, pretty, file, magic_string, mode=None):
     elif mode == "ar":
         flags = "--strip-debug -p -R .gnu.lto_* -R .gnu.debuglto_* -R .llvm.lto -N __gnu_lto_v1"
         if context.spec.pkg_clang:
+            tool = "llvm-objcopy"
             cmd = '{} llvm-objcopy {} "{}"'
+
+    if debug_file:
+        flags = '-f "{}"'.format(debug_file)
+        tool = "eu-strip"
+        cmd = '{} eu-strip {} "{}"'
     try:
         s = " ".join(exports)
-        subprocess.check_call(cmd.format(s, flags, file), shell=True)
+        with timed(tool):
+            subprocess.check_call(cmd.format(s, flags, file), shell=True)
         console_ui.emit_info("Stripped", pretty)
     except Exception as e:
         console_ui.emit_warning("Strip", "Failed to strip '{}'".format(pretty))
         print(e)
+        return False
+    return True
 
 
-def get_debug_path(context, file, magic_string):
-    """Grab the NT_GNU_BUILD_ID"""
-    cmd = 'LC_ALL=C readelf -n "{}"'.format(file)
-    try:
-        lines = subprocess.check_output(cmd, shell=True).decode()
-    except Exception as e:
-        return None
+def resolve_strip_mode(requested):
+    """Turn the requested strip mode into the one we will actually use,
+    as the combined mode depends on elfutils being available"""
+    if requested == STRIP_MODE_SEPARATE:
+        return STRIP_MODE_SEPARATE
+    if shutil.which("eu-strip") is not None:
+        return STRIP_MODE_COMBINED
+    if requested == STRIP_MODE_COMBINED:
+        console_ui.emit_warning(
+            "Strip", "eu-strip not found, splitting debug info separately"
+        )
+    return STRIP_MODE_SEPARATE
+
+
+def split_and_strip(context, pretty, file, kind, mode):
+    """Split out debug information and strip the file, according to the
+    strip mode selected for this build, reusing cached results for
+    identical input where possible.
+
+    Returns the number of tool invocations avoided compared to running
+    the separate mode from scratch, whether the strip cache was hit
+    (None when there is no cache), and the debug file written, if any."""
+    debug_file = None
+    if mode != "ar":
+        debug_file = get_debug_file(context, pretty, file)
+    if debug_file is None and not context.spec.pkg_strip:
+        return 0, None, None
+
+    # objcopy twice for the debug split, and then strip
+    baseline = 0
+    if debug_file:
+        baseline += 2
+    if context.spec.pkg_strip:
+        baseline += 1
+
+    compression = get_split_compression(context)
+
+    cache = context.strip_cache
+    key = None
+    if cache is not None:
+        debug_rel = ""
+        if debug_file:
+            debug_rel = remove_prefix(debug_file, context.get_install_dir())
+        with timed("strip-cache"):
+            key = cache.get_key(
+                file,
+                mode,
+                context.strip_mode,
+                context.spec.pkg_strip,
+                " ".join(get_strip_exports(context)),
+                debug_rel,
+                context.minidebuginfo,
+                compression,
+            )
+            hit = cache.restore(key, file, debug_file)
+        if hit:
+            console_ui.emit_info("Stripped", "{} (cached)".format(pretty))
+            return baseline, True, debug_file
+
+    # eu-strip has no --strip-unneeded, so kernel modules are always split
+    # and stripped separately to keep their output unchanged
+    if (
+        debug_file
+        and context.strip_mode == STRIP_MODE_COMBINED
+        and context.spec.pkg_strip
+        and mode != "ko"
+    ):
+        ok = strip_file(context, pretty, file, kind, mode=mode, debug_file=debug_file)
+        saved = baseline - 1
+        # eu-strip can't compress, so compress after and fix up the CRC
+        if ok and compression:
+            with timed("objcopy"):
+                ok = compress_debug((compression, debug_file))
+            saved -= 1
+        if ok and compression:
+            try:
+                ok = fix_debuglink(file, debug_file)
+            except Exception as e:
+                print(e)
+                ok = False
+            if not ok:
+                console_ui.emit_warning(
+                    "Debug", "Failed to fix .gnu_debuglink of {}".format(pretty)
+                )
+    else:
+        ok = True
+        if debug_file:
+            ok = store_debug(
+                context, pretty, file, kind, did_full=debug_file, compression=compression
+            )
+        ok = strip_file(context, pretty, file, kind, mode=mode) and ok
+        saved = 0
 
-    for line in lines.split("\n"):
-        if "Build ID:" not in line:
-            continue
-        v = line.split(":")[1].strip()
+    if ok and debug_file and context.minidebuginfo and context.spec.pkg_strip:
+        if mode == "shared" or mode == "executable":
+            ok = add_minidebuginfo(context, pretty, file, debug_file)
 
-        libdir = "/usr/lib"
-        if "ELF 32" in magic_string:
-            libdir = "/usr/lib32"
+    if cache is None:
+        return saved, None, debug_file
+    if ok:
+        with timed("strip-cache"):
+            cache.store(key, file, debug_file)
+    return saved, False, debug_file
 
-        path = os.path.join(libdir, "debug", ".build-id", v[0:2], v[2:])
-        return path + ".debug"
-    return None
+
+def get_build_id_path(build_id, elf32=False):
+    """Return the /usr/lib/debug/.build-id path for a hex build-id"""
+    libdir = "/usr/lib"
+    if elf32:
+        libdir = "/usr/lib32"
+
+    path = os.path.join(libdir, "debug", ".build-id", build_id[0:2], build_id[2:])
+    return path + ".debug"
+
+
+def get_debug_path(context, file):
+    """Grab the NT_GNU_BUILD_ID straight from the note segment, returning
+    the debug path and whether this is a 32-bit object"""
+    try:
+        with open_elf(file) as efile:
+            elf32 = not efile.is_64bit()
+            build_id = efile.get_build_id()
+    except Exception as e:
+        return None, False
+    if build_id is None:
+        return None, elf32
+    return get_build_id_path(build_id.hex(), elf32), elf32
 
 
 def get_xattrs(context, pretty, file):
@@ -353,51 +595,148 @@ def get_xattrs(context, pretty, file):
     return attributes
 
 
+# Outcomes of the classification stage
+CLASSIFY_SKIP = 0
+CLASSIFY_NUKE = 1
+CLASSIFY_EXAMINE = 2
+
+
+def init_worker(context, examiner):
+    """Pool initializer, sharing the build context with each worker"""
+    global share_ctx
+    global share_examiner
+    share_ctx = context
+    share_examiner = examiner
+    set_enabled(context.examine_profile)
+
+
+def get_full_path(context, pretty):
+    """Map a path within the package onto the install directory"""
+    return os.path.join(context.get_install_dir(), pretty[1:])
+
+
+def classify_work(item):
+    """First pipeline stage: classify a file and decide whether it is to
+    be removed, examined further, or simply left alone.
+
+    Work items and results only carry the package name and path, as
+    everything else can be derived from the shared context."""
+    name, pretty = item
+    fpath = get_full_path(share_ctx, pretty)
+    begin_file()
+    try:
+        with timed("classify"):
+            st = os.lstat(fpath)
+            kind = classify_file(pretty, fpath, st)
+    except Exception as e:
+        print(e)
+        return name, pretty, FileKind.OTHER, CLASSIFY_SKIP, end_file(), None
+
+    # Identify hardlinked files so they're only processed once
+    inode = None
+    if stat.S_ISREG(st.st_mode) and st.st_nlink > 1:
+        inode = (st.st_dev, st.st_ino)
+
+    verdict = CLASSIFY_SKIP
+    if share_examiner.should_nuke_file(share_ctx, pretty, fpath, kind):
+        verdict = CLASSIFY_NUKE
+    elif share_examiner.file_is_of_interest(pretty, fpath, kind):
+        verdict = CLASSIFY_EXAMINE
+    return name, pretty, kind, verdict, end_file(), inode
+
+
+def examine_work(item):
+    """Unpack a work item for the pool, tagging the report with the name
+    of the owning package so results can be consumed unordered"""
+    name, pretty, kind = item
+    begin_file()
+    with timed("examine"):
+        freport = examine_file(pretty, get_full_path(share_ctx, pretty), kind)
+    freport.timings = end_file()
+    return name, freport
+
+
+def examine_batch(items):
+    """Examine a batch of files, to keep the number of round trips to the
+    pool down for packages with many files"""
+    return [examine_work(x) for x in items]
+
+
 def examine_file(*args):
     global share_ctx
-    package = args[0]
-    pretty = args[1]
-    file = args[2]
-    mgs = args[3]
+    pretty = args[0]
+    file = args[1]
+    kind = args[2]
 
     context = share_ctx
 
     xattrs = None
-    if v_dyn.match(mgs):
+    mode = None
+    if kind == FileKind.ELF_SHARED:
         # Get soname, direct deps and strip
-        store_debug(context, pretty, file, mgs)
-        strip_file(context, pretty, file, mgs, mode="shared")
-    elif v_bin.match(mgs) or v_pie.match(mgs):
+        mode = "shared"
+    elif kind == FileKind.ELF_EXEC or kind == FileKind.ELF_PIE:
         # Preserve xattr *before* stripping the file.
-        xattrs = get_xattrs(context, pretty, file)
+        with timed("xattr"):
+            xattrs = get_xattrs(context, pretty, file)
         # Get direct deps, and strip
-        store_debug(context, pretty, file, mgs)
-        strip_file(context, pretty, file, mgs, mode="executable")
-    elif v_rel.match(mgs):
+        mode = "executable"
+    elif kind == FileKind.ELF_REL:
         # Kernel object in all probability
         if file.endswith(".ko"):
-            store_debug(context, pretty, file, mgs)
-            strip_file(context, pretty, file, mgs, mode="ko")
-    elif mgs == "current ar archive":
+            mode = "ko"
+    elif kind == FileKind.AR_ARCHIVE:
         # Strip only.
-        strip_file(context, pretty, file, mgs, mode="ar")
-
-    freport = FileReport(pretty, file, mgs)
+        mode = "ar"
+
+    skipped = False
+    if mode == "shared" or mode == "executable":
+        with timed("elf"):
+            skipped = is_stripped(file)
+        if skipped:
+            # Prebuilt or already stripped, don't rewrite it for nothing
+            mode = None
+
+    if mode:
+        start_time = timer()
+        saved, cached, debug_file = split_and_strip(context, pretty, file, kind, mode)
+        strip_time = timer() - start_time
+
+    freport = FileReport(pretty, file, kind)
     if xattrs and len(xattrs) > 0:
         freport.xattrs = xattrs
+    freport.strip_skipped = skipped
+    if mode:
+        freport.strip_time = strip_time
+        freport.strip_saved = saved
+        freport.strip_cached = cached
+        if debug_file and os.path.exists(debug_file):
+            freport.debug_file = remove_prefix(debug_file, context.get_install_dir())
     return freport
 
 
-def store_debug(context, pretty, file, magic_string):
+def is_stripped(file):
+    """Check the section headers for anything left to strip or split"""
+    try:
+        with open_elf(file) as efile:
+            return efile.is_stripped()
+    except Exception:
+        return False
+
+
+def get_debug_file(context, pretty, file):
+    """Determine where the split debug information for file should live
+    within the install directory, creating its parent directory"""
     if not context.can_dbginfo:
-        return
+        return None
     if not context.spec.pkg_debug:
-        return
+        return None
 
-    did = get_debug_path(context, file, magic_string)
+    with timed("build-id"):
+        did, elf32 = get_debug_path(context, file)
 
     if did is None:
-        if "ELF 32" in magic_string:
+        if elf32:
             did = "/usr/lib32/debug/{}.debug".format(pretty)
         else:
             did = "/usr/lib/debug/{}.debug".format(pretty)
@@ -412,20 +751,99 @@ def store_debug(context, pretty, file, magic_string):
         pass
     if not os.path.exists(dirs):
         console_ui.emit_error("Debug", "Failed to make directory")
-        return
+        return None
+    return did_full
+
 
+def store_debug(context, pretty, file, kind, did_full=None, compression=None):
+    if did_full is None:
+        did_full = get_debug_file(context, pretty, file)
+    if did_full is None:
+        return True
+
+    # Compress before the debuglink CRC is taken of the debug file
     cmd = 'objcopy --only-keep-debug "{}" "{}"'.format(file, did_full)
+    if compression:
+        cmd = 'objcopy --only-keep-debug --compress-debug-sections={} "{}" "{}"'.format(
+            compression, file, did_full
+        )
     try:
-        subprocess.check_call(cmd, shell=True)
+        with timed("objcopy"):
+            subprocess.check_call(cmd, shell=True)
     except Exception as e:
         console_ui.emit_warning("objcopy", "Failed --only-keep-debug")
-        return
+        return False
     cmd = 'objcopy --add-gnu-debuglink="{}" "{}"'.format(did_full, file)
     try:
-        subprocess.check_call(cmd, shell=True)
+        with timed("objcopy"):
+            subprocess.check_call(cmd, shell=True)
     except Exception as e:
         console_ui.emit_warning("objcopy", "Failed --add-gnu-debuglink")
-        return
+        return False
+    return True
+
+
+def get_defined_symbols(file, dynamic=False, types=None):
+    """Names of the symbols defined in file, optionally only those of the
+    given nm(1) symbol types"""
+    cmd = ["nm", "--format=posix", "--defined-only"]
+    if dynamic:
+        cmd.append("-D")
+    output = subprocess.check_output(
+        cmd + [file], env={"LC_ALL": "C", "PATH": os.environ.get("PATH", "")}
+    )
+    symbols = set()
+    for line in output.decode("utf-8", errors="replace").split("\n"):
+        splits = line.split(" ")
+        if len(splits) < 2:
+            continue
+        if types is not None and splits[1] not in types:
+            continue
+        symbols.add(splits[0])
+    return symbols
+
+
+def add_minidebuginfo(context, pretty, file, debug_file):
+    """Embed a minimal, xz compressed, symbol table derived from the split
+    debug file into the stripped file as .gnu_debugdata, allowing stack
+    traces to be symbolised without the full debug information"""
+    try:
+        with timed("nm"):
+            dynsyms = get_defined_symbols(file, dynamic=True)
+            funcsyms = get_defined_symbols(debug_file, types=["T", "t", "D"])
+    except Exception as e:
+        console_ui.emit_warning("MiniDebug", "Failed to read symbols of {}".format(pretty))
+        print(e)
+        return False
+
+    with tempfile.TemporaryDirectory(prefix="ypkg-minidebug-") as tmpdir:
+        keep_symbols = os.path.join(tmpdir, "keep_symbols")
+        mini_debuginfo = os.path.join(tmpdir, "mini_debuginfo")
+        # The dynamic symbols are already available from the file itself
+        with open(keep_symbols, "w") as outfile:
+            for sym in sorted(funcsyms - dynsyms):
+                outfile.write(sym + "\n")
+
+        cmd = (
+            "objcopy -S --remove-section .gdb_index --remove-section .comment "
+            '--keep-symbols="{}" "{}" "{}"'.format(keep_symbols, debug_file, mini_debuginfo)
+        )
+        try:
+            with timed("objcopy"):
+                subprocess.check_call(cmd, shell=True)
+            with timed("xz"):
+                with open(mini_debuginfo, "rb") as infile:
+                    data = lzma.compress(infile.read())
+                with open(mini_debuginfo + ".xz", "wb") as outfile:
+                    outfile.write(data)
+            cmd = 'objcopy --add-section .gnu_debugdata="{}.xz" "{}"'.format(mini_debuginfo, file)
+            with timed("objcopy"):
+                subprocess.check_call(cmd, shell=True)
+        except Exception as e:
+            console_ui.emit_warning("MiniDebug", "Failed to add .gnu_debugdata to {}".format(pretty))
+            print(e)
+            return False
+    return True
 
 
 class PackageExaminer:
@@ -435,12 +853,12 @@ class PackageExaminer:
     """
 
     def __init__(self):
-        self.libtool_file = re.compile("libtool library file, ASCII text.*")
         self.can_kernel = True
+        self.profile = ExamineProfile()
 
-    def should_nuke_file(self, context, pretty, file, mgs):
+    def should_nuke_file(self, context, pretty, file, kind):
         # it's not that we hate.. Actually, no, we do. We hate you libtool.
-        if context.spec.pkg_lastrip and self.libtool_file.match(mgs):
+        if context.spec.pkg_lastrip and kind == FileKind.LIBTOOL:
             return True
         if pretty == "/usr/share/info/dir":
             return True
@@ -455,93 +873,213 @@ class PackageExaminer:
                 return True
         return False
 
-    def file_is_of_interest(self, pretty, file, mgs):
+    def file_is_of_interest(self, pretty, file, kind):
         """So we can keep our list of things to check low"""
-        if v_dyn.match(mgs) or v_bin.match(mgs) or v_pie.match(mgs) or v_rel.match(mgs):
+        if FileKind.is_elf(kind):
             if not self.can_kernel and file.endswith(".ko"):
                 return False
             return True
-        if is_pkgconfig_file(pretty, mgs):
+        # Compressed modules can only be scanned, not stripped
+        if self.can_kernel and is_compressed_module(file):
+            return True
+        if is_pkgconfig_file(pretty, kind):
             return True
-        if is_soname_link(file, mgs):
+        if is_soname_link(file, kind):
             return True
-        if is_static_archive(file, mgs):
+        if is_static_archive(file, kind):
             return True
-        if self.can_kernel and is_system_map(file, mgs):
+        if self.can_kernel and is_system_map(file, kind):
             return True
         return False
 
-    def examine_package(self, context, package):
-        """Examine the given package and update symbols, etc."""
-        install_dir = context.get_install_dir()
+    def restore_hardlink(self, context, source, dest):
+        """Only source was stripped on behalf of its hardlinks, so ensure
+        dest still links to it, as the tools may have replaced the file"""
+        spath = get_full_path(context, source)
+        dpath = get_full_path(context, dest)
+        try:
+            if os.path.samefile(spath, dpath):
+                return
+            tmp = dpath + ".ypkg-link"
+            os.link(spath, tmp)
+            os.rename(tmp, dpath)
+        except Exception as e:
+            console_ui.emit_warning(
+                "Examine", "Failed to restore hardlink: {}".format(dest)
+            )
+            print(e)
+
+    def remove_unwanted(self, package, pretty, fpath):
+        """Remove a file flagged by should_nuke_file from disk and package"""
+        try:
+            if os.path.isfile(fpath) or os.path.islink(fpath):
+                os.unlink(fpath)
+            else:
+                shutil.rmtree(fpath)
+        except Exception as e:
+            console_ui.emit_error(
+                "Clean", "Failed to remove unwantedfile: {}".format(e)
+            )
+            return False
+        console_ui.emit_info("Clean", "Removed unwanted file: {}".format(pretty))
+        package.remove_file(pretty)
+        return True
+
+    def examine_packages(self, context, packages):
+        """Examine all packages, in order to update dependencies, etc.
+
+        This runs as a streaming pipeline on a single pool shared by every
+        package: files are classified in parallel, and anything of interest
+        is queued for stripping and scanning as soon as it is classified.
+        Unwanted files are only removed once the pool has drained."""
+        console_ui.emit_info("Examine", "Examining packages")
 
         global share_ctx
+        global share_examiner
         global global_xattrs
 
         share_ctx = context
+        share_examiner = self
+        set_enabled(context.examine_profile)
 
-        # Right now we actually only care about magic matching
-        removed = set()
+        owners = dict()
+        work = list()
+        for package in packages:
+            owners[package.name] = package
+            for file in package.emit_files():
+                if file[0] != "/":
+                    file = "/" + file
+                work.append((package.name, file))
 
-        pool = multiprocessing.Pool()
-        results = list()
+        examinations = dict()
+        if len(work) == 0:
+            return examinations
 
-        for file in package.emit_files():
-            if file[0] == "/":
-                file = file[1:]
-            fpath = os.path.join(install_dir, file)
-            try:
-                mgs = magic.from_file(fpath)
-            except Exception as e:
-                print(e)
-                continue
-            if self.should_nuke_file(context, "/" + file, fpath, mgs):
-                try:
-                    if os.path.isfile(fpath):
-                        os.unlink(fpath)
-                    else:
-                        shutil.rmtree(fpath)
-                except Exception as e:
-                    console_ui.emit_error(
-                        "Clean", "Failed to remove unwantedfile: {}".format(e)
+        start_time = timer()
+        removals = list()
+        results = list()
+        batch = list()
+        # .so links inspect their target, which may still be being stripped
+        deferred = list()
+        # Hardlinked files by inode, and the links sharing each examination
+        linked = dict()
+        aliases = dict()
+
+        jobs = max(1, min(context.build.jobcount, len(work)))
+        chunk = max(1, min(64, len(work) // (jobs * 4)))
+        pool = multiprocessing.Pool(
+            processes=jobs, initializer=init_worker, initargs=(context, self)
+        )
+        try:
+            classified = pool.imap_unordered(classify_work, work, chunksize=chunk)
+            for name, pretty, kind, verdict, times, inode in classified:
+                self.profile.add(name, pretty, times)
+                if verdict == CLASSIFY_NUKE:
+                    removals.append((name, pretty))
+                elif verdict == CLASSIFY_EXAMINE:
+                    item = (name, pretty, kind)
+                    if kind == FileKind.SYMLINK:
+                        deferred.append(item)
+                        continue
+                    if inode is not None:
+                        # Wait until all of the links are known
+                        linked.setdefault(inode, list()).append(item)
+                        continue
+                    batch.append(item)
+                    if len(batch) >= chunk:
+                        results.append(pool.apply_async(examine_batch, [batch]))
+                        batch = list()
+            # Examine the first of each set of hardlinks, on behalf of all
+            for inode in linked:
+                items = sorted(linked[inode], key=lambda x: x[1])
+                batch.append(items[0])
+                aliases[items[0][1]] = items[1:]
+            if batch:
+                results.append(pool.apply_async(examine_batch, [batch]))
+            infos = list()
+            for result in results:
+                infos.extend(result.get())
+            infos.extend(pool.imap_unordered(examine_work, deferred, chunksize=chunk))
+            for name, info in infos:
+                self.profile.add(name, info.pretty, info.timings)
+                if name not in examinations:
+                    examinations[name] = list()
+                examinations[name].append(info)
+        finally:
+            pool.close()
+            pool.join()
+        self.profile.wall_time = timer() - start_time
+
+        nlinks = 0
+        for name in list(examinations):
+            for info in list(examinations[name]):
+                for alias, pretty, kind in aliases.get(info.pretty, []):
+                    self.restore_hardlink(context, info.pretty, pretty)
+                    examinations.setdefault(alias, list()).append(
+                        info.make_alias(pretty)
                     )
-                    return False
-                console_ui.emit_info(
-                    "Clean", "Removed unwanted file: {}".format("/" + file)
-                )
-                removed.add("/" + file)
-                continue
-
-            if not self.file_is_of_interest("/" + file, fpath, mgs):
-                continue
-            # Handle this asynchronously
-            results.append(
-                pool.apply_async(
-                    examine_file, [package, "/" + file, fpath, mgs], callback=None
-                )
+                    nlinks += 1
+        if nlinks > 0:
+            console_ui.emit_info(
+                "Examine", "Examined {} hardlinked file(s) just once".format(nlinks)
             )
 
-        pool.close()
-        pool.join()
-
-        infos = [x.get() for x in results]
-        for info in infos:
-            if not info.xattrs:
-                continue
-            global_xattrs[info.pretty] = info.xattrs
-
-        for r in removed:
-            package.remove_file(r)
-        return infos
+        for name, pretty in sorted(removals):
+            fpath = get_full_path(context, pretty)
+            if not self.remove_unwanted(owners[name], pretty, fpath):
+                # Consistent with a failed examination, skip the package
+                examinations.pop(name, None)
+
+        for name in examinations:
+            # Keep reports in a stable order regardless of completion order
+            examinations[name].sort(key=lambda x: x.pretty)
+            for info in examinations[name]:
+                if not info.xattrs:
+                    continue
+                global_xattrs[info.pretty] = info.xattrs
+            self.report_strip_times(context, name, examinations[name])
+        self.report_strip_cache(context, examinations)
+        return examinations
 
-    def examine_packages(self, context, packages):
-        """Examine all packages, in order to update dependencies, etc"""
-        console_ui.emit_info("Examine", "Examining packages")
+    def report_strip_cache(self, context, examinations):
+        """Summarise strip cache efficiency, and keep it within bounds"""
+        cache = context.strip_cache
+        if cache is None:
+            return
+        hits = 0
+        misses = 0
+        for name in examinations:
+            for info in examinations[name]:
+                if info.strip_cached is True:
+                    hits += 1
+                elif info.strip_cached is False:
+                    misses += 1
+        console_ui.emit_info(
+            "StripCache", "{} hit(s), {} miss(es)".format(hits, misses)
+        )
+        removed, freed = cache.prune()
+        if removed > 0:
+            console_ui.emit_info(
+                "StripCache",
+                "Evicted {} entries, freeing {}".format(removed, naturalsize(freed)),
+            )
 
-        examinations = dict()
-        for package in packages:
-            ir = self.examine_package(context, package)
-            if not ir:
-                continue
-            examinations[package.name] = ir
-        return examinations
+    def report_strip_times(self, context, name, infos):
+        """Summarise the time spent splitting and stripping a package"""
+        skipped = len([x for x in infos if x.strip_skipped])
+        if skipped > 0:
+            console_ui.emit_info(
+                "Strip",
+                "{}: skipped {} already stripped file(s)".format(name, skipped),
+            )
+        stripped = [x for x in infos if x.strip_time is not None]
+        if len(stripped) == 0:
+            return
+        elapsed = timedelta(seconds=sum(x.strip_time for x in stripped))
+        saved = sum(x.strip_saved for x in stripped)
+        msg = "{}: processed {} file(s) in {} ({} mode".format(
+            name, len(stripped), elapsed, context.strip_mode or STRIP_MODE_SEPARATE
+        )
+        if saved > 0:
+            msg += ", {} tool invocations avoided".format(saved)
+        console_ui.emit_info("Strip", msg + ")")
@@ -0,0 +1,84 @@
+#!/bin/true
+# -*- coding: utf-8 -*-
+#
+#  This file is part of ypkg2
+#
+#  Copyright 2025 Solus Project
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+
+import gzip
+import lzma
+import zstandard as zstd
+
+from .elf import ElfError, ElfFile, open_elf
+
+# Module file suffixes that kmod knows how to load
+KMOD_SUFFIXES = (".ko", ".ko.zst", ".ko.xz", ".ko.gz")
+
+
+def is_kernel_module(file):
+    """Whether file is named like a (possibly compressed) kernel module"""
+    return file.endswith(KMOD_SUFFIXES)
+
+
+def is_compressed_module(file):
+    return is_kernel_module(file) and not file.endswith(".ko")
+
+
+def read_module(file):
+    """Return the decompressed ELF image of a compressed kernel module"""
+    with open(file, "rb") as fd:
+        if file.endswith(".zst"):
+            dctx = zstd.ZstdDecompressor()
+            # Content size is not always recorded in the frame header
+            with dctx.stream_reader(fd) as reader:
+                return reader.read()
+        if file.endswith(".xz"):
+            return lzma.decompress(fd.read())
+        if file.endswith(".gz"):
+            return gzip.decompress(fd.read())
+    raise ElfError("Unknown module compression: {}".format(file))
+
+
+def parse_modinfo(data):
+    """Split the contents of a .modinfo section into a dict mapping each
+    field to the list of its values, in order of appearance. Fields such
+    as alias or parm legitimately occur many times."""
+    fields = dict()
+    for entry in data.split(b"\0"):
+        if not entry or b"=" not in entry:
+            continue
+        key, value = entry.split(b"=", 1)
+        key = key.decode("utf-8", errors="replace")
+        value = value.decode("utf-8", errors="replace")
+        fields.setdefault(key, list()).append(value)
+    return fields
+
+
+def get_modinfo(file):
+    """Read the .modinfo fields of the kernel module at file, as modinfo
+    would, without spawning it. Compressed modules are decompressed in
+    memory."""
+    if is_compressed_module(file):
+        efile = ElfFile(read_module(file), name=file)
+    else:
+        efile = open_elf(file)
+    with efile:
+        data = efile.get_section_data(".modinfo")
+    if data is None:
+        return dict()
+    return parse_modinfo(data)
+
+
+def get_vermagic(file):
+    """Convenience wrapper returning the vermagic string of a module, or
+    None if it has none"""
+    values = get_modinfo(file).get("vermagic")
+    if not values:
+        return None
+    return values[0]
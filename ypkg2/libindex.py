@@ -0,0 +1,135 @@
+#!/bin/true
+# -*- coding: utf-8 -*-
+#
+#  This file is part of ypkg2
+#
+#  Copyright 2025 Solus Project
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+
+import os
+import pickle
+import tempfile
+
+import pisi.context
+
+from .pisidb import get_installdb
+from .util import console_ui
+
+# Bump whenever the pickled layout changes
+INDEX_VERSION = 2
+
+# Default library search order, as used by DependencyResolver
+LIBRARY_PATHS = ["/usr/lib64", "/usr/lib"]
+LIBRARY_PATHS32 = ["/usr/lib32", "/usr/lib", "/usr/lib64"]
+
+
+def is_library_path(path):
+    """Only shared objects can satisfy a DT_NEEDED entry"""
+    return ".so" in os.path.basename(path)
+
+
+def get_installdb_stamp():
+    """Every install, upgrade or removal adds or removes a directory under
+    the packages dir of the InstallDB, touching its mtime"""
+    return os.stat(pisi.context.config.packages_dir()).st_mtime_ns
+
+
+def get_installed_entries():
+    """Map each installed package to its directory under the packages dir
+    of the InstallDB, which is named after its name, version and release"""
+    entries = dict()
+    for entry in os.listdir(pisi.context.config.packages_dir()):
+        entries[entry.rsplit("-", 2)[0]] = entry
+    return entries
+
+
+class LibraryIndex:
+    """Maps the shared libraries of installed packages to their owners by
+    absolute path, so that the owner of a library is a dictionary lookup
+    rather than a FilesDB query and a walk over the owner's files.
+
+    Packages are only indexed once a lookup leads to them, and the index
+    is kept on disk, dropping packages as they are removed or replaced by
+    another version. Each installed version of a package is therefore
+    only read from the InstallDB once."""
+
+    def __init__(self):
+        self.entries = dict()
+        # Library paths, by packages dir entry
+        self.packages = dict()
+        self.paths = dict()
+        self.dirty = False
+
+    def get_owner(self, fpath):
+        """Return the package owning fpath, if already indexed"""
+        return self.paths.get(fpath)
+
+    def add_package(self, pkg):
+        """Index the libraries of an installed package, if not yet known"""
+        entry = self.entries.get(pkg)
+        if entry is None or entry in self.packages:
+            return
+        libs = list()
+        for file in get_installdb().get_files(pkg).list:
+            fpath = "/" + file.path
+            if is_library_path(fpath):
+                libs.append(fpath)
+                self.paths[fpath] = pkg
+        self.packages[entry] = libs
+        self.dirty = True
+
+    def load(self, path):
+        """Load a previously saved index, keeping only the packages that
+        are still installed at the same version"""
+        self.entries = get_installed_entries()
+        try:
+            with open(path, "rb") as infile:
+                version, packages = pickle.load(infile)
+        except Exception:
+            return False
+        if version != INDEX_VERSION:
+            return False
+        for entry, libs in packages.items():
+            pkg = entry.rsplit("-", 2)[0]
+            if self.entries.get(pkg) != entry:
+                self.dirty = True
+                continue
+            self.packages[entry] = libs
+            for fpath in libs:
+                self.paths[fpath] = pkg
+        return True
+
+    def save(self, path):
+        """Atomically write the index out to path, if anything changed"""
+        if not self.dirty:
+            return
+        dirn = os.path.dirname(path)
+        os.makedirs(dirn, mode=0o0755, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=dirn, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as outfile:
+                data = (INDEX_VERSION, self.packages)
+                pickle.dump(data, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp, path)
+        except Exception:
+            os.unlink(tmp)
+            raise
+        self.dirty = False
+
+
+def get_library_index(path):
+    """Load the index kept at path, or start a new one. Returns None if the
+    InstallDB could not be read at all."""
+    index = LibraryIndex()
+    try:
+        index.load(path)
+    except Exception as e:
+        console_ui.emit_warning("Dependency", "Failed to load library index")
+        print(e)
+        return None
+    return index
@@ -16,9 +16,6 @@ import sys
 import os
 
 import pisi.specfile
-from pisi.db.filesdb import FilesDB
-from pisi.db.installdb import InstallDB
-from pisi.db.packagedb import PackageDB
 import typer
 from typing_extensions import Annotated
 
@@ -31,6 +28,12 @@ from .history import (
     MAX_HISTORY_LEN,
 )
 from .build import build_package
+from .debuginfo import DEBUG_COMPRESSION
+from .debuginfod import serve_debuginfo
+from .pisidb import get_installdb, get_packagedb
+from .pkgconfigcache import PkgconfigProviders
+from .stripcache import DEFAULT_CACHE_SIZE
+from .ypkgcontext import YpkgContext
 from .ypkgspec import YpkgSpec, PackageHistory
 from .util import console_ui, pkgconfig_dep, pkgconfig32_dep
 
@@ -64,6 +67,48 @@ def build(
     no_color: Annotated[
         bool, typer.Option("--no-colors", "-n", help="Disable color output.")
     ] = False,
+    strip_mode: Annotated[
+        str,
+        typer.Option(
+            "--strip-mode",
+            help="How to split debug info: separate (objcopy), combined (eu-strip) or auto.",
+        ),
+    ] = "separate",
+    strip_cache_size: Annotated[
+        int,
+        typer.Option(
+            "--strip-cache-size",
+            help="Enable the strip cache, limited to this size in MiB. Off (0) by default.",
+        ),
+    ] = DEFAULT_CACHE_SIZE,
+    examine_profile: Annotated[
+        bool,
+        typer.Option(
+            "--examine-profile",
+            help="Time each examine step per file, writing a JSON report to the output directory.",
+        ),
+    ] = False,
+    debug_compression: Annotated[
+        str,
+        typer.Option(
+            "--debug-compression",
+            help="Compress the DWARF sections of split debug files: none, zlib or zstd.",
+        ),
+    ] = "none",
+    dwz: Annotated[
+        bool,
+        typer.Option(
+            "--dwz",
+            help="De-duplicate DWARF across the debug files of each package with dwz.",
+        ),
+    ] = False,
+    minidebuginfo: Annotated[
+        bool,
+        typer.Option(
+            "--minidebuginfo",
+            help="Embed a compressed symbol table (.gnu_debugdata) in stripped binaries.",
+        ),
+    ] = False,
 ):
     """
     Build a package from a YPKG YAML file.
@@ -105,7 +150,27 @@ def build(
         )
         sys.exit(1)
 
-    build_package(filename, outputDir, buildDir)
+    if strip_mode not in ["auto", "combined", "separate"]:
+        console_ui.emit_error("Opt", f"Unknown strip mode: {strip_mode}")
+        sys.exit(1)
+
+    if debug_compression not in DEBUG_COMPRESSION:
+        console_ui.emit_error(
+            "Opt", f"Unknown debug compression: {debug_compression}"
+        )
+        sys.exit(1)
+
+    build_package(
+        filename,
+        outputDir,
+        buildDir,
+        strip_mode,
+        strip_cache_size,
+        examine_profile,
+        debug_compression,
+        dwz,
+        minidebuginfo,
+    )
 
 
 @app.command()
@@ -239,10 +304,6 @@ def install_deps(
     pcdeps = set()
     ndeps = set()
 
-    idb = InstallDB()
-    pdb = PackageDB()
-    fdb = FilesDB()
-
     console_ui.emit_info(
         "BuildDep",
         f"Checking build-deps for {spec.pkg_name}-{spec.pkg_version}-{spec.pkg_release}",
@@ -258,7 +319,7 @@ def install_deps(
             if em:
                 pcdeps.add(em.group(1))
                 continue
-            if not idb.has_package(dep):
+            if not get_installdb().has_package(dep):
                 ndeps.add(dep)
 
     if spec.pkg_checkdeps:
@@ -271,11 +332,14 @@ def install_deps(
             if em:
                 pcdeps.add(em.group(1))
                 continue
-            if not idb.has_package(dep):
+            if not get_installdb().has_package(dep):
                 ndeps.add(dep)
 
     # Get the global known pkgconfig providers
-    pkgConfigs, pkgConfigs32 = pdb.get_pkgconfig_providers()
+    path = os.path.join(YpkgContext(spec).get_build_prefix(), "pkgconfig-providers")
+    providers = PkgconfigProviders(path)
+    if pc32deps or pcdeps:
+        pkgConfigs, pkgConfigs32 = providers.get_repo_providers()
 
     for i in pc32deps:
         local = False
@@ -283,20 +347,20 @@ def install_deps(
 
         # Try global pkgconfig names first.
         if i in pkgConfigs32:
-            pkg = pdb.get_package(pkgConfigs32[i])
+            pkg = get_packagedb().get_package(pkgConfigs32[i])
         elif i in pkgConfigs:
-            pkg = pdb.get_package(pkgConfigs[i])
+            pkg = get_packagedb().get_package(pkgConfigs[i])
 
         # Try the filesdb
         if not pkg:
             local = True
-            nom = fdb.get_pkgconfig32_provider(i)
+            nom = providers.get_installed_provider(i, emul32=True)
             if nom:
-                pkg = idb.get_package_by_pkgconfig32(nom[0])
+                pkg = get_installdb().get_package_by_pkgconfig32(nom[0])
         if not pkg:
-            nom = fdb.get_pkgconfig_provider(i)
+            nom = providers.get_installed_provider(i)
             if nom:
-                pkg = idb.get_package_by_pkgconfig(nom[0])
+                pkg = get_installdb().get_package_by_pkgconfig(nom[0])
 
         if local:
             console_ui.emit_warning(
@@ -308,18 +372,18 @@ def install_deps(
                 f"pkgconfig32({i}) build dep doesn't exist in the repository.",
             )
             sys.exit(1)
-        if not idb.has_package(pkg.name):
+        if not get_installdb().has_package(pkg.name):
             ndeps.add(pkg.name)
 
     for i in pcdeps:
         local = False
         pkg = None
         if i in pkgConfigs:
-            pkg = pdb.get_package(pkgConfigs[i])
+            pkg = get_packagedb().get_package(pkgConfigs[i])
         if not pkg:
-            nom = fdb.get_pkgconfig_provider(i)
+            nom = providers.get_installed_provider(i)
             if nom:
-                pkg = idb.get_package_by_pkgconfig(nom[0])
+                pkg = get_installdb().get_package_by_pkgconfig(nom[0])
             local = True
         if local:
             console_ui.emit_warning(
@@ -331,9 +395,15 @@ def install_deps(
                 f"pkgconfig({i}) build dep does not exist in the repository.",
             )
             sys.exit(1)
-        if not idb.has_package(pkg.name):
+        if not get_installdb().has_package(pkg.name):
             ndeps.add(pkg.name)
 
+    try:
+        providers.save()
+    except Exception as e:
+        console_ui.emit_warning("BuildDep", "Failed to save pkgconfig providers")
+        print(e)
+
     if len(ndeps) < 1:
         console_ui.emit_success("BuildDep", "All build deps satisfied")
         sys.exit(0)
@@ -349,7 +419,7 @@ def install_deps(
     if no_color:
         cmd += " -N"
 
-    invalid = [x for x in ndeps if not pdb.has_package(x)]
+    invalid = [x for x in ndeps if not get_packagedb().has_package(x)]
     if len(invalid) > 0:
         console_ui.emit_error("BuildDep", f"Unknown build deps: {' '.join(invalid)}")
         sys.exit(1)
@@ -362,5 +432,35 @@ def install_deps(
         sys.exit(1)
 
 
+@app.command(name="serve-debuginfo")
+def serve_debuginfo_cmd(
+    directory: Annotated[
+        str,
+        typer.Argument(help="Output directory holding the build-id index."),
+    ] = ".",
+    port: Annotated[
+        int,
+        typer.Option("--port", "-p", help="Port to listen on."),
+    ] = 8002,
+    bind: Annotated[
+        str,
+        typer.Option(
+            "--bind", "-b", help="Address to listen on, use 0.0.0.0 for all interfaces."
+        ),
+    ] = "127.0.0.1",
+    no_color: Annotated[
+        bool, typer.Option("--no-colors", "-n", help="Disable color output.")
+    ] = False,
+):
+    """
+    Serves debug files and executables by build-id, debuginfod-style.
+    """
+    if no_color:
+        console_ui.allow_colors = False
+
+    if not serve_debuginfo(os.path.abspath(directory), port, bind):
+        sys.exit(1)
+
+
 if __name__ == "__main__":
     app()
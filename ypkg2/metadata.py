@@ -25,7 +25,6 @@ import pisi.util
 import pisi.metadata
 import pisi.specfile
 import pisi.package
-from pisi.db.installdb import InstallDB
 
 from .util import (
     console_ui,
@@ -34,6 +33,7 @@ from .util import (
     readlink,
 )
 from . import examine
+from .pisidb import get_installdb
 
 FileTypes = OrderedDict(
     [
@@ -122,12 +122,26 @@ def create_files_xml(context, package):
 
     # TODO: Remove reliance on pisi.util functions completely.
 
-    for path in sorted(package.emit_files()):
+    # Hardlinked files are only hashed once, tarfile already stores the
+    # subsequent links as hardlinks within the install archive
+    hashes = dict()
+
+    for path in package.emit_files():
         if path[0] == "/":
             path = path[1:]
 
         full_path = os.path.join(context.get_install_dir(), path)
-        fpath, hash = pisi.util.calculate_hash(full_path)
+        st = os.lstat(full_path)
+        inode = None
+        if stat.S_ISREG(st.st_mode) and st.st_nlink > 1:
+            inode = (st.st_dev, st.st_ino)
+
+        if inode in hashes:
+            fpath, hash = full_path, hashes[inode]
+        else:
+            fpath, hash = pisi.util.calculate_hash(full_path)
+            if inode is not None:
+                hashes[inode] = hash
 
         if os.path.islink(fpath):
             fsize = int(len(readlink(full_path)))
@@ -281,15 +295,8 @@ def construct_package_name(context, package):
     return "{}.{}".format("-".join(parts), extension)
 
 
-global idb
-
-idb = None
-
-
 def handle_dependencies(context, gene, metadata, package, files):
     """Insert providers and dependencies into the spec"""
-    global idb
-
     # Insert the simple guys first, replaces/conflicts, as these don't map
     # to internal names at all and are completely from the user
     if package.name in context.spec.replaces:
@@ -356,9 +363,7 @@ def handle_dependencies(context, gene, metadata, package, files):
             continue
         if dependency not in all_names:
             # External dependency
-            if not idb:
-                idb = InstallDB()
-            pkg = idb.get_package(dependency)
+            pkg = get_installdb().get_package(dependency)
             newDep.package = dependency
             # Special case, kernel.image is an explicit dependency
             if pkg.partOf == "kernel.image":
@@ -538,7 +543,7 @@ def write_spec(context, gene, outputDir):
             setattr(specPkg, item, getattr(package.package, item))
 
         # Now the fun bit.
-        for f in sorted(gene.packages[pkg].emit_files()):
+        for f in gene.packages[pkg].emit_files():
             fc = pisi.specfile.Path()
             fc.path = f
             fc.fileType = get_file_type(f)
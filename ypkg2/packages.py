@@ -17,12 +17,47 @@
 
 import os
 
+from .patternmatch import PatternMatcher
 from .stringglob import StringPathGlob
 
 PRIORITY_DEFAULT = 0  # Standard internal priority for a pattern
 PRIORITY_USER = 100  # Priority for a user pattern, do what they say.
 DBG = 1000  # Never allow the user to override these guys.
 
+# Give up resolving a path after this many symlinks, as the kernel does
+MAX_SYMLINKS = 40
+
+
+def resolve_in_root(root, path):
+    """Resolve any symlinks in path as os.path.realpath would, treating
+    root as the filesystem root, so that absolute link targets within
+    the install directory point back into it"""
+    parts = [x for x in path.split(os.sep) if x]
+    parts.reverse()
+    resolved = os.sep
+    links = 0
+    while parts:
+        part = parts.pop()
+        if part == ".":
+            continue
+        if part == "..":
+            resolved = os.path.dirname(resolved)
+            continue
+        candidate = os.path.join(resolved, part)
+        try:
+            target = os.readlink(os.path.join(root, candidate[1:]))
+        except OSError:
+            # Not a link, or doesn't exist at all
+            resolved = candidate
+            continue
+        links += 1
+        if links > MAX_SYMLINKS:
+            return os.path.normpath(path)
+        if target.startswith(os.sep):
+            resolved = os.sep
+        parts.extend(reversed([x for x in target.split(os.sep) if x]))
+    return resolved
+
 
 class DefaultPolicy(StringPathGlob):
     def __init__(self):
@@ -45,6 +80,16 @@ class Package:
     # List of permanent files
     permanent = None
 
+    # PatternMatcher over our patterns, compiled on demand
+    matcher = None
+
+    # Bumped whenever files are added, removed or excluded
+    version = 0
+
+    # (version, result) of emit_files and emit_files_by_pattern
+    emitted = None
+    emitted_patterns = None
+
     def __init__(self, name):
         self.name = name
         self.patterns = dict()
@@ -61,12 +106,12 @@ class Package:
         """Return a matching pattern for the given path.
         This is ordered according to priority to enable
         multiple layers of priorities"""
-        matches = [p for p in self.patterns if p.match(path)]
-        if len(matches) == 0:
+        if self.matcher is None:
+            self.matcher = PatternMatcher(self.patterns)
+        match = self.matcher.match(path)
+        if match is None:
             return self.default_policy
-
-        matches = sorted(matches, key=StringPathGlob.get_priority, reverse=True)
-        return matches[0]
+        return match
 
     def add_file(self, pattern, path, permanent):
         """Add a file by a given pattern to this package"""
@@ -74,10 +119,12 @@ class Package:
             pattern = self.default_policy
         if pattern not in self.patterns:
             self.patterns[pattern] = set()
+            self.matcher = None
         self.patterns[pattern].add(path)
         self.files.add(path)
         if permanent:
             self.permanent.add(path)
+        self.version += 1
 
     def remove_file(self, path):
         """Remove a file from this package if it owns it"""
@@ -88,23 +135,26 @@ class Package:
             self.patterns[pat].remove(path)
         if path in self.files:
             self.files.remove(path)
+        self.version += 1
 
     def exclude_file(self, path):
         """Exclude a file from this package if it captures it"""
-        pat = self.get_pattern(path)
-        if not pat:
-            return
         if path in self.files:
             self.files.remove(path)
         self.excludes.add(path)
+        self.version += 1
 
     def emit_files(self):
-        """Emit actual file lists, vs the globs we have"""
+        """Emit actual file lists, vs the globs we have. The sorted tuple
+        is kept until the files of this package change."""
+        if self.emitted is not None and self.emitted[0] == self.version:
+            return self.emitted[1]
         ret = set()
         for pt in self.patterns:
             adds = [x for x in self.patterns[pt] if x not in self.excludes]
             ret.update(adds)
-        return sorted(ret)
+        self.emitted = (self.version, tuple(sorted(ret)))
+        return self.emitted[1]
 
     def is_permanent(self, path):
         """Determine if a path if a permanent path or not"""
@@ -114,6 +164,9 @@ class Package:
         """Emit file lists, using the globs though. Note that eopkg has no
         exclude concept, this is left for us to handle as we build the
         resulting eopkg ourselves"""
+        if self.emitted_patterns is not None:
+            if self.emitted_patterns[0] == self.version:
+                return self.emitted_patterns[1]
         ret = set()
         for pt in self.patterns:
             pat = self.patterns[pt]
@@ -126,7 +179,8 @@ class Package:
                 ret.update(tmp)
             else:
                 ret.add(str(pt))
-        return sorted(ret)
+        self.emitted_patterns = (self.version, tuple(sorted(ret)))
+        return self.emitted_patterns[1]
 
 
 class PackageGenerator:
@@ -134,10 +188,24 @@ class PackageGenerator:
     packages = None
     permanent = None
 
-    def __init__(self, spec):
+    # Maps each added path to the name of the package it was placed in
+    owners = None
+
+    # Install directory that symlinks are resolved within, if known
+    root = None
+    realpaths = None
+
+    # PatternMatchers over patterns and permanent, compiled on demand
+    matcher = None
+    permanent_matcher = None
+
+    def __init__(self, spec, root=None):
         self.patterns = dict()
         self.packages = dict()
         self.permanent = set()
+        self.owners = dict()
+        self.root = root
+        self.realpaths = dict()
 
         if spec.pkg_permanent:
             for perm in spec.pkg_permanent:
@@ -275,15 +343,16 @@ class PackageGenerator:
         if pattern:
             target = self.patterns[pattern]
 
-        permanent = False
-        for perm in self.permanent:
-            if perm.match(path):
-                permanent = True
-                break
+        if self.permanent_matcher is None:
+            self.permanent_matcher = PatternMatcher(self.permanent)
+        permanent = self.permanent_matcher.match(path) is not None
 
         if target not in self.packages:
             self.packages[target] = Package(target)
         self.packages[target].add_file(pattern, path, permanent)
+        self.owners[path] = target
+        # New files may change how links resolve
+        self.realpaths.clear()
 
     def remove_file(self, path):
         """Remove a file from our set, in any of our main or sub packages
@@ -291,17 +360,16 @@ class PackageGenerator:
 
         for pkg in self.packages:
             self.packages[pkg].remove_file(path)
+        self.owners.pop(path, None)
+        self.realpaths.clear()
 
     def get_pattern(self, path):
         """Return a matching pattern for the given path.
         This is ordered according to priority to enable
         multiple layers of priorities"""
-        matches = [p for p in self.patterns if p.match(path)]
-        if len(matches) == 0:
-            return None
-
-        matches = sorted(matches, key=StringPathGlob.get_priority, reverse=True)
-        return matches[0]
+        if self.matcher is None:
+            self.matcher = PatternMatcher(self.patterns)
+        return self.matcher.match(path)
 
     def add_pattern(self, pattern, pkgName, priority=PRIORITY_DEFAULT):
         """Add a pattern to the internal map according to the
@@ -315,6 +383,7 @@ class PackageGenerator:
 
         obj = StringPathGlob(pattern, prefixMatch=is_prefix, priority=priority)
         self.patterns[obj] = pkgName
+        self.matcher = None
 
     def add_permanent_pattern(self, pattern):
         """Add a pattern to our mapping of permanent paths."""
@@ -326,28 +395,45 @@ class PackageGenerator:
 
         obj = StringPathGlob(pattern, prefixMatch=is_prefix)
         self.permanent.add(obj)
+        self.permanent_matcher = None
 
     def emit_packages(self):
         """Ensure we've finalized our state, allowing proper theft and
         exclusion to take place, and then return all package objects
         that we've managed to generate. There is no gaurantee that
         a "main" package will be generated, as patterns may omit
-        the production of one."""
-
-        for package in self.packages:
-            for comparison in self.packages:
-                if comparison == package:
-                    continue
-                for file in self.packages[comparison].emit_files():
-                    self.packages[package].exclude_file(file)
+        the production of one.
+
+        The owners table is authoritative, so a file captured by any
+        package other than its owner is excluded from it in a single
+        pass over all files."""
+
+        for name in self.packages:
+            package = self.packages[name]
+            stolen = [x for x in package.files if self.owners.get(x, name) != name]
+            for file in stolen:
+                package.exclude_file(file)
+
+    def resolve_path(self, file):
+        """Return the real path of file, resolved within the install
+        directory when we know it"""
+        rname = self.realpaths.get(file)
+        if rname is None:
+            if self.root is None:
+                rname = os.path.realpath(file)
+            else:
+                rname = resolve_in_root(self.root, file)
+            self.realpaths[file] = rname
+        return rname
 
     def get_file_owner(self, file):
         """Return the owning package for the specified file"""
-        rname = os.path.realpath(file)
-        for pkg in self.packages:
+        for path in [file, self.resolve_path(file)]:
+            pkg = self.owners.get(path)
+            if pkg is None:
+                continue
             package = self.packages[pkg]
-            if file in package.files:
-                return package
-            elif rname in package.files:
+            # Files may also be removed from the Package directly
+            if path in package.files:
                 return package
         return None
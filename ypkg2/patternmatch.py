@@ -0,0 +1,121 @@
+#!/bin/true
+# -*- coding: utf-8 -*-
+#
+#  This file is part of ypkg2
+#
+#  Copyright 2025 Solus Project
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+
+import fnmatch
+import os
+import re
+
+from .stringglob import StringPathGlob
+
+
+class PatternNode:
+    """One path segment deep into the trie"""
+
+    __slots__ = ["literals", "globs", "terminals", "prefixes"]
+
+    def __init__(self):
+        # Child nodes by exact segment
+        self.literals = dict()
+        # (segment, compiled glob, node) for segments with wildcards
+        self.globs = list()
+        # Patterns matching any path reaching this node
+        self.terminals = list()
+        # Prefix patterns, only matching if the path continues past here
+        self.prefixes = list()
+
+    def get_literal(self, segment):
+        node = self.literals.get(segment)
+        if node is None:
+            node = PatternNode()
+            self.literals[segment] = node
+        return node
+
+    def get_glob(self, segment):
+        for glob, _, node in self.globs:
+            if glob == segment:
+                return node
+        node = PatternNode()
+        matcher = re.compile(fnmatch.translate(segment)).match
+        self.globs.append((segment, matcher, node))
+        return node
+
+
+class PatternMatcher:
+    """A set of StringPathGlob patterns compiled into a segment trie, so
+    that the best pattern for a path is found in a single walk over its
+    segments, rather than by splitting and testing every pattern.
+
+    The result is identical to testing each pattern with match() and
+    picking the highest priority, with ties going to the pattern that
+    was added first."""
+
+    def __init__(self, patterns):
+        self.root = PatternNode()
+        for order, pattern in enumerate(patterns):
+            self.add(order, pattern)
+
+    def add(self, order, pattern):
+        # Sort key for the leaves, highest priority first
+        entry = (-pattern.priority, order, pattern)
+        splits = pattern.pattern.split(os.sep)
+
+        if pattern.prefixMatch:
+            # Mirrors StringPathGlob.match, which only honours plain prefixes
+            if not pattern.pattern.endswith(os.sep):
+                return
+            if StringPathGlob.is_a_pattern(pattern.pattern):
+                return
+            node = self.root
+            for segment in splits[:-1]:
+                node = node.get_literal(segment)
+            node.prefixes.append(entry)
+            return
+
+        node = self.root
+        for segment in splits:
+            if StringPathGlob.is_a_pattern(segment):
+                node = node.get_glob(segment)
+            else:
+                node = node.get_literal(segment)
+        node.terminals.append(entry)
+
+    def match(self, path):
+        """Return the highest priority pattern matching path, or None"""
+        best = None
+        nodes = [self.root]
+        for segment in path.split(os.sep):
+            following = list()
+            for node in nodes:
+                # The path continues past this node
+                for entry in node.terminals:
+                    if best is None or entry < best:
+                        best = entry
+                for entry in node.prefixes:
+                    if best is None or entry < best:
+                        best = entry
+                child = node.literals.get(segment)
+                if child is not None:
+                    following.append(child)
+                for glob, matcher, child in node.globs:
+                    if segment == glob or matcher(segment):
+                        following.append(child)
+            nodes = following
+            if not nodes:
+                break
+        for node in nodes:
+            for entry in node.terminals:
+                if best is None or entry < best:
+                    best = entry
+        if best is None:
+            return None
+        return best[2]
@@ -0,0 +1,52 @@
+#!/bin/true
+# -*- coding: utf-8 -*-
+#
+#  This file is part of ypkg2
+#
+#  Copyright 2025 Solus Project
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+
+from pisi.db.filesdb import FilesDB
+from pisi.db.installdb import InstallDB
+from pisi.db.packagedb import PackageDB
+
+# The pisi databases, shared by every module in the process. Opening them
+# is costly, so each one is only opened when first queried, and packages
+# that never need a lookup never open them at all.
+
+global idb
+global pdb
+global fdb
+
+idb = None
+pdb = None
+fdb = None
+
+
+def get_installdb():
+    """Return the shared InstallDB, opening it on first use"""
+    global idb
+    if idb is None:
+        idb = InstallDB()
+    return idb
+
+
+def get_packagedb():
+    """Return the shared PackageDB, opening it on first use"""
+    global pdb
+    if pdb is None:
+        pdb = PackageDB()
+    return pdb
+
+
+def get_filesdb():
+    """Return the shared FilesDB, opening it on first use"""
+    global fdb
+    if fdb is None:
+        fdb = FilesDB()
+    return fdb
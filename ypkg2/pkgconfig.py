@@ -0,0 +1,144 @@
+#!/bin/true
+# -*- coding: utf-8 -*-
+#
+#  This file is part of ypkg2
+#
+#  Copyright 2025 Solus Project
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+
+import os
+import re
+
+# Tokens of a Requires list: comparison operators and everything else
+requires_token = re.compile(r"(<=|>=|!=|=|<|>)|([^\s,<>=!]+)")
+variable_ref = re.compile(r"\$\$|\$\{([^}]*)\}")
+definition = re.compile(r"^([A-Za-z0-9_.]+)\s*([=:])(.*)$")
+
+# Parsed files, keyed by path and validated against their stat info
+_cache = dict()
+
+
+class PkgConfigRequire:
+    """A single entry of a Requires or Requires.private list"""
+
+    def __init__(self, name, operator=None, version=None):
+        self.name = name
+        self.operator = operator
+        self.version = version
+
+    def __str__(self):
+        if self.operator is None:
+            return self.name
+        return "{} {} {}".format(self.name, self.operator, self.version)
+
+    def __eq__(self, obj2):
+        return str(self) == str(obj2)
+
+    def __hash__(self):
+        return hash(str(self))
+
+
+class PkgConfigFile:
+    """In-process parser for .pc files, sufficient to extract what examine
+    needs without spawning pkg-config for every file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)[:-3] if path.endswith(".pc") else path
+        self.variables = dict()
+        self.fields = dict()
+
+        # pkg-config always provides the location of the file itself
+        self.variables["pcfiledir"] = os.path.dirname(os.path.abspath(path))
+
+        with open(path, "r", encoding="utf-8", errors="replace") as pcfile:
+            for line in self.logical_lines(pcfile.read()):
+                m = definition.match(line)
+                if not m:
+                    continue
+                key, kind, value = m.group(1), m.group(2), m.group(3).strip()
+                value = self.expand(value)
+                if kind == "=":
+                    self.variables[key] = value
+                else:
+                    self.fields[key.lower()] = value
+
+    @staticmethod
+    def logical_lines(text):
+        """Join continued lines and drop comments"""
+        text = text.replace("\\\n", " ")
+        for line in text.split("\n"):
+            out = []
+            i = 0
+            while i < len(line):
+                c = line[i]
+                if c == "\\" and i + 1 < len(line) and line[i + 1] == "#":
+                    out.append("#")
+                    i += 2
+                    continue
+                if c == "#":
+                    break
+                out.append(c)
+                i += 1
+            line = "".join(out).strip()
+            if line:
+                yield line
+
+    def expand(self, value):
+        """Expand ${variable} references, as pkg-config would"""
+
+        def repl(m):
+            if m.group(0) == "$$":
+                return "$"
+            return self.variables.get(m.group(1), "")
+
+        return variable_ref.sub(repl, value)
+
+    def get_field(self, key):
+        return self.fields.get(key.lower())
+
+    @staticmethod
+    def parse_requires(value):
+        """Split a Requires list into its entries, preserving versions"""
+        ret = list()
+        if not value:
+            return ret
+        tokens = [(m.group(1), m.group(2)) for m in requires_token.finditer(value)]
+        i = 0
+        while i < len(tokens):
+            op, word = tokens[i]
+            i += 1
+            if word is None:
+                # Stray operator, nothing sane to attach it to
+                continue
+            req = PkgConfigRequire(word)
+            if i + 1 < len(tokens) and tokens[i][0] and tokens[i + 1][1]:
+                req.operator = tokens[i][0]
+                req.version = tokens[i + 1][1]
+                i += 2
+            ret.append(req)
+        return ret
+
+    def get_requires(self):
+        return self.parse_requires(self.get_field("Requires"))
+
+    def get_requires_private(self):
+        return self.parse_requires(self.get_field("Requires.private"))
+
+
+def load_pkgconfig(path):
+    """Parse the .pc file at path, reusing an earlier parse when the file
+    has not changed since"""
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+    cached = _cache.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    pc = PkgConfigFile(path)
+    _cache[path] = (stamp, pc)
+    return pc
@@ -0,0 +1,122 @@
+#!/bin/true
+# -*- coding: utf-8 -*-
+#
+#  This file is part of ypkg2
+#
+#  Copyright 2025 Solus Project
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+
+import hashlib
+import os
+import pickle
+import tempfile
+
+import pisi.context
+
+from .libindex import get_installdb_stamp
+from .pisidb import get_filesdb, get_packagedb
+
+# Bump whenever the pickled layout changes
+SNAPSHOT_VERSION = 1
+
+
+def get_repo_checksum():
+    """Combine the checksums of every repository index known to pisi, which
+    only change when the repositories are updated"""
+    h = hashlib.sha1()
+    index_dir = pisi.context.config.index_dir()
+    for root, dirs, files in os.walk(index_dir):
+        dirs.sort()
+        for f in sorted(files):
+            if not f.endswith(".sha1sum"):
+                continue
+            fpath = os.path.join(root, f)
+            h.update(os.path.relpath(fpath, index_dir).encode("utf-8"))
+            with open(fpath, "rb") as infile:
+                h.update(infile.read())
+    return h.hexdigest()
+
+
+class PkgconfigProviders:
+    """Snapshot of the pkgconfig providers known to the repositories, along
+    with the answers the FilesDB gave for installed pkgconfig files.
+
+    PackageDB.get_pkgconfig_providers walks the whole repository index,
+    so the result is kept on disk until either the repositories are
+    updated or the set of installed packages changes. Nothing is read
+    until the first lookup."""
+
+    def __init__(self, path):
+        self.path = path
+        self.loaded = False
+        self.dirty = False
+        self.key = None
+
+        self.pkgConfigs = None
+        self.pkgConfigs32 = None
+        self.installed = {False: dict(), True: dict()}
+
+    def get_key(self):
+        return (SNAPSHOT_VERSION, get_repo_checksum(), get_installdb_stamp())
+
+    def load(self):
+        """Load the snapshot if still current, or scan the repositories"""
+        if self.loaded:
+            return
+        self.loaded = True
+        try:
+            self.key = self.get_key()
+        except Exception:
+            self.key = None
+        try:
+            with open(self.path, "rb") as infile:
+                key, providers, installed = pickle.load(infile)
+            if self.key is not None and key == self.key:
+                self.pkgConfigs, self.pkgConfigs32 = providers
+                self.installed = installed
+                return
+        except Exception:
+            pass
+        self.pkgConfigs, self.pkgConfigs32 = get_packagedb().get_pkgconfig_providers()
+        self.dirty = True
+
+    def get_repo_providers(self):
+        """Return the (pkgconfig, pkgconfig32) name to package maps"""
+        self.load()
+        return self.pkgConfigs, self.pkgConfigs32
+
+    def get_installed_provider(self, name, emul32=False):
+        """Cached FilesDB.get_pkgconfig_provider/get_pkgconfig32_provider"""
+        self.load()
+        known = self.installed[emul32]
+        if name not in known:
+            if emul32:
+                nom = get_filesdb().get_pkgconfig32_provider(name)
+            else:
+                nom = get_filesdb().get_pkgconfig_provider(name)
+            known[name] = tuple(nom) if nom else None
+            self.dirty = True
+        return known[name]
+
+    def save(self):
+        """Atomically write the snapshot out, if anything changed"""
+        if not self.dirty or self.key is None:
+            return
+        dirn = os.path.dirname(self.path)
+        os.makedirs(dirn, mode=0o0755, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=dirn, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as outfile:
+                providers = (self.pkgConfigs, self.pkgConfigs32)
+                data = (self.key, providers, self.installed)
+                pickle.dump(data, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp, self.path)
+        except Exception:
+            os.unlink(tmp)
+            raise
+        self.dirty = False
@@ -0,0 +1,178 @@
+#!/bin/true
+# -*- coding: utf-8 -*-
+#
+#  This file is part of ypkg2
+#
+#  Copyright 2025 Solus Project
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+
+import fcntl
+import hashlib
+import os
+import shutil
+import stat
+import tempfile
+
+# ioctl to share extents between files on filesystems that support it
+FICLONE = 0x40049409
+
+# Default upper bound for the cache, in MiB. The cache is opt-in.
+DEFAULT_CACHE_SIZE = 0
+
+
+def copy_contents(fsrc, fdst):
+    """Copy fsrc over the start of fdst, sharing extents via a reflink where
+    possible and falling back to a plain copy"""
+    try:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    except OSError:
+        shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+    # dst may well have been longer than src
+    fdst.truncate(os.fstat(fsrc.fileno()).st_size)
+
+
+def clone_file(src, dst):
+    """Replace the contents of dst with those of src. The inode, and
+    therefore the mode, ownership, xattrs and hardlinks of dst are kept.
+
+    An existing dst is only written to once src has been cloned in full
+    to a temporary file next to it, so failing to read src (i.e. a bad
+    cache entry) or to make the copy leaves dst untouched. dst itself is
+    then overwritten in place, and a failure at that point can leave it
+    partially written. Read-only files are made writable for the
+    duration."""
+    if not os.path.lexists(dst):
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            copy_contents(fsrc, fdst)
+        return
+
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dst), prefix=".ypkg-clone-")
+    try:
+        with open(src, "rb") as fsrc, os.fdopen(fd, "wb") as ftmp:
+            copy_contents(fsrc, ftmp)
+
+        mode = None
+        if not os.access(dst, os.W_OK):
+            mode = os.stat(dst).st_mode
+            os.chmod(dst, mode | stat.S_IWUSR)
+        try:
+            # Overwrite in place, rather than rename, to keep the inode
+            with open(tmp, "rb") as ftmp, open(dst, "r+b") as fdst:
+                copy_contents(ftmp, fdst)
+        finally:
+            if mode is not None:
+                os.chmod(dst, stat.S_IMODE(mode))
+    finally:
+        os.unlink(tmp)
+
+
+class StripCache:
+    """Content addressed cache of stripped binaries and their split debug
+    files, so that byte-identical build output (i.e. from ccache hits) is
+    not stripped and split all over again on every rebuild.
+
+    Entries are keyed by the SHA-256 of the unstripped file along with
+    everything that influences the result, such as the strip mode and
+    toolchain. The cache is bounded in size, evicting the least recently
+    used entries first."""
+
+    def __init__(self, path, max_size):
+        self.path = path
+        self.max_size = max_size
+
+    def get_key(self, file, *salt):
+        """Compute the key for the current contents of file"""
+        h = hashlib.sha256()
+        for item in salt:
+            h.update(str(item).encode("utf-8"))
+            h.update(b"\0")
+        with open(file, "rb") as fd:
+            while True:
+                chunk = fd.read(1024 * 1024)
+                if not chunk:
+                    break
+                h.update(chunk)
+        return h.hexdigest()
+
+    def get_entry(self, key):
+        return os.path.join(self.path, key[0:2], key)
+
+    def restore(self, key, file, debug_file):
+        """Restore a cached result over file (and debug_file), returning
+        True on a cache hit"""
+        entry = self.get_entry(key)
+        stripped = os.path.join(entry, "stripped")
+        debug = os.path.join(entry, "debug")
+        if not os.path.exists(stripped):
+            return False
+        if debug_file and not os.path.exists(debug):
+            return False
+        try:
+            if debug_file:
+                clone_file(debug, debug_file)
+            clone_file(stripped, file)
+            # Mark it as recently used
+            os.utime(entry)
+        except Exception:
+            return False
+        return True
+
+    def store(self, key, file, debug_file):
+        """Store the freshly stripped file (and debug file) under key"""
+        entry = self.get_entry(key)
+        if os.path.exists(entry):
+            return
+        parent = os.path.dirname(entry)
+        try:
+            os.makedirs(parent, mode=0o0755, exist_ok=True)
+            tmp = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+        except Exception:
+            return
+        try:
+            shutil.copyfile(file, os.path.join(tmp, "stripped"))
+            if debug_file:
+                shutil.copyfile(debug_file, os.path.join(tmp, "debug"))
+            # Another worker may have beaten us to it, that is fine
+            os.rename(tmp, entry)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def prune(self):
+        """Evict least recently used entries until we're within the size
+        bound, returning the number of entries and bytes removed"""
+        entries = list()
+        total = 0
+        if not os.path.isdir(self.path):
+            return 0, 0
+        for prefix in os.listdir(self.path):
+            pdir = os.path.join(self.path, prefix)
+            if not os.path.isdir(pdir):
+                continue
+            for key in os.listdir(pdir):
+                entry = os.path.join(pdir, key)
+                try:
+                    size = sum(
+                        os.path.getsize(os.path.join(entry, x))
+                        for x in os.listdir(entry)
+                    )
+                    mtime = os.stat(entry).st_mtime
+                except Exception:
+                    continue
+                entries.append((mtime, size, entry))
+                total += size
+
+        removed = 0
+        freed = 0
+        for mtime, size, entry in sorted(entries):
+            if total <= self.max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            freed += size
+            removed += 1
+        return removed, freed
@@ -0,0 +1,153 @@
+#!/bin/true
+# -*- coding: utf-8 -*-
+#
+#  This file is part of ypkg2
+#
+#  Copyright 2025 Solus Project
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+
+import json
+
+from contextlib import contextmanager
+from datetime import timedelta
+from timeit import default_timer as timer
+
+from .util import console_ui
+
+# Nothing is collected unless profiling was asked for
+enabled = False
+
+# Sub-operation timings for the file currently being examined. Each pool
+# worker only ever examines a single file at a time.
+current = None
+
+# Time spent in nested blocks, per level of timed() currently active
+nesting = list()
+
+
+def set_enabled(enable):
+    """Turn collection on or off for this process"""
+    global enabled
+    enabled = enable
+
+
+def begin_file():
+    """Start collecting timings for a new file, if enabled"""
+    global current
+    if enabled:
+        current = dict()
+
+
+def end_file():
+    """Stop collecting, returning the timings gathered for the file, or
+    None when not enabled"""
+    global current
+    timings = current
+    current = None
+    return timings
+
+
+def add_time(op, elapsed):
+    """Account elapsed seconds to op for the current file"""
+    if current is None:
+        return
+    current[op] = current.get(op, 0.0) + elapsed
+
+
+@contextmanager
+def timed(op):
+    """Account the wall time of the enclosed block to op. Time spent in
+    nested blocks is only accounted to the innermost one, so that the
+    operations of a file add up to the total time spent on it."""
+    if not enabled:
+        yield
+        return
+    start = timer()
+    nesting.append(0.0)
+    try:
+        yield
+    finally:
+        inner = nesting.pop()
+        elapsed = timer() - start
+        if nesting:
+            nesting[-1] += elapsed
+        add_time(op, elapsed - inner)
+
+
+class ExamineProfile:
+    """Wall time spent per sub-operation (libmagic, strip, objcopy, ...)
+    for every file passing through examine, aggregated across the pool"""
+
+    def __init__(self):
+        self.files = dict()
+        self.wall_time = 0.0
+
+    def add(self, package, pretty, timings):
+        if not timings:
+            return
+        key = (package, pretty)
+        entry = self.files.setdefault(key, dict())
+        for op in timings:
+            entry[op] = entry.get(op, 0.0) + timings[op]
+
+    def get_tool_totals(self):
+        """Map each sub-operation to its total time and file count"""
+        totals = dict()
+        for timings in self.files.values():
+            for op in timings:
+                seconds, count = totals.get(op, (0.0, 0))
+                totals[op] = (seconds + timings[op], count + 1)
+        return totals
+
+    def get_slowest(self, count):
+        """Return the count slowest files as (package, pretty, seconds)"""
+        ret = [(k[0], k[1], sum(v.values())) for k, v in self.files.items()]
+        ret.sort(key=lambda x: x[2], reverse=True)
+        return ret[0:count]
+
+    def write(self, path):
+        """Write the full profile out as JSON"""
+        files = list()
+        for package, pretty, seconds in self.get_slowest(len(self.files)):
+            files.append(
+                {
+                    "package": package,
+                    "path": pretty,
+                    "total": seconds,
+                    "timings": self.files[(package, pretty)],
+                }
+            )
+        totals = dict()
+        for op, (seconds, count) in sorted(self.get_tool_totals().items()):
+            totals[op] = {"seconds": seconds, "files": count}
+        report = {"wall_time": self.wall_time, "totals": totals, "files": files}
+        with open(path, "w") as outfile:
+            json.dump(report, outfile, indent=2)
+
+    def report(self, count=10):
+        """Summarise per-tool totals and the slowest files on the console"""
+        console_ui.emit_info(
+            "Profile",
+            "Examined {} file(s) in {}".format(
+                len(self.files), timedelta(seconds=self.wall_time)
+            ),
+        )
+        totals = self.get_tool_totals()
+        for op in sorted(totals, key=lambda x: totals[x][0], reverse=True):
+            seconds, nfiles = totals[op]
+            console_ui.emit_info(
+                "Profile",
+                "{}: {} across {} file(s)".format(
+                    op, timedelta(seconds=seconds), nfiles
+                ),
+            )
+        for package, pretty, seconds in self.get_slowest(count):
+            console_ui.emit_info(
+                "Profile",
+                "{} ({}): {}".format(pretty, package, timedelta(seconds=seconds)),
+            )
@@ -273,6 +273,22 @@ class YpkgContext:
 
     can_dbginfo = False
 
+    # One of the examine.STRIP_MODE_* values, set up by build_package
+    strip_mode = None
+
+    # Optional stripcache.StripCache shared across rebuilds
+    strip_cache = None
+
+    # Post-processing of split debug files, see debuginfo
+    debug_compress = None
+    dwz = False
+
+    # Embed a .gnu_debugdata symbol table into stripped binaries
+    minidebuginfo = False
+
+    # Collect per-file examine timings, see timings
+    examine_profile = False
+
     def __init__(self, spec, emul32=False, avx2=False):
         self.spec = spec
         self.emul32 = emul32
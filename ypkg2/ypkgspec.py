@@ -14,6 +14,7 @@
 from . import yamlhelper
 
 from .yamlhelper import OneOrMoreString, MultimapFormat
+from .dedupe import DEDUPE_MODES
 from .sources import SourceManager, GitSource
 
 import os
@@ -95,6 +96,7 @@ class YpkgSpec:
     pkg_strip = True
     pkg_lastrip = True
     pkg_mancompress = True
+    pkg_dedupe = None
     pkg_ccache = True
     pkg_emul32 = False
     pkg_avx2 = False
@@ -212,6 +214,7 @@ class YpkgSpec:
                 ("strip", bool),
                 ("lastrip", bool),
                 ("mancompress", bool),
+                ("dedupe", str),
                 ("ccache", bool),
                 ("emul32", bool),
                 ("networking", bool),
@@ -402,6 +405,13 @@ class YpkgSpec:
             console_ui.emit_error("YAML", "No functional build steps found")
             return False
 
+        if self.pkg_dedupe and self.pkg_dedupe not in DEDUPE_MODES:
+            console_ui.emit_error(
+                "YAML:dedupe",
+                "Must be one of: {}".format(", ".join(DEDUPE_MODES)),
+            )
+            return False
+
         # Validate the names and version
         if not PackageSanity.is_version_valid(self.pkg_version):
             return False